@@ -0,0 +1,230 @@
+"""
+Замеры запросов к API: количество и время SQL, время сериализации и рендеринга ответа, время остального
+кода вьюхи (аутентификация, права доступа) и общее время по каждой вьюхе.
+
+InstrumentationMiddleware включается настройкой INSTRUMENTATION_ENABLED; выключенная, она убирает себя
+из цепочки middleware (MiddlewareNotUsed) и ничего не стоит. Замеряется доля запросов
+INSTRUMENTATION_SAMPLE_RATE: SQL считается через connection.execute_wrapper, рендеринг - между
+process_template_response и завершением render(). Код приложения добавляет свои этапы через timed():
+вьюхи привычек замеряют так сериализацию (serialize). Этапы не пересекаются: время SQL внутри
+этапа считается только в db, поэтому сумма этапов не превышает общее время запроса.
+
+Результаты отдаются в заголовке Server-Timing (INSTRUMENTATION_SERVER_TIMING) и накапливаются
+в счётчиках процесса, которые отдаёт вьюха metrics в текстовом формате Prometheus - только по токену
+METRICS_TOKEN (заголовок Authorization: Bearer <токен>); без заданного токена счётчики не отдаются.
+Счётчики у каждого процесса свои: при нескольких воркерах каждый воркер показывает свою долю запросов.
+"""
+
+import hmac
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+from config import settings
+
+# Границы корзин гистограммы времени ответа, секунды
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса; длительности этапов в секундах"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases = defaultdict(float)
+
+    def add(self, phase, duration):
+        self.phases[phase] += duration
+
+    def measured(self):
+        """Суммарное время всех этапов"""
+        return sum(self.phases.values())
+
+    def add_exclusive(self, phase, started, measured):
+        """Добавляет к этапу phase время с момента started без времени этапов, замеренных за это время
+        (measured - сумма этапов в момент started): SQL внутри этапа считается только в db"""
+        duration = time.perf_counter() - started - (self.measured() - measured)
+        self.add(phase, max(duration, 0))
+
+
+@contextmanager
+def timed(phase):
+    """Добавляет время выполнения блока к этапу phase текущего запроса, если запрос замеряется.
+    Время SQL и вложенных этапов внутри блока к phase не добавляется"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started, measured = time.perf_counter(), metrics.measured()
+    try:
+        yield
+    finally:
+        metrics.add_exclusive(phase, started, measured)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка connection.execute_wrapper: считает запросы и время SQL"""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.add("db", time.perf_counter() - started)
+
+
+class MetricsRegistry:
+    """Счётчики процесса по вьюхам: запросы по статусам, гистограмма времени ответа,
+    суммарное количество SQL-запросов и время этапов"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+            self.durations = defaultdict(float)
+            self.queries = defaultdict(int)
+            self.phases = defaultdict(float)
+
+    def observe(self, view, status_code, total, queries, phases):
+        with self.lock:
+            self.requests[(view, status_code)] += 1
+            self.durations[view] += total
+            self.queries[view] += queries
+            buckets = self.buckets[view]
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if total <= bound:
+                    buckets[position] += 1
+            for phase, duration in phases.items():
+                self.phases[(view, phase)] += duration
+
+    def render(self):
+        """Счётчики в текстовом формате Prometheus"""
+        with self.lock:
+            counts = defaultdict(int)
+            for (view, _), count in self.requests.items():
+                counts[view] += count
+            lines = [
+                "# HELP http_requests_total Замеренные запросы по вьюхам и статусам ответа",
+                "# TYPE http_requests_total counter",
+            ]
+            lines += [
+                f'http_requests_total{{view="{view}",status="{status_code}"}} {count}'
+                for (view, status_code), count in sorted(self.requests.items())
+            ]
+            lines += [
+                "# HELP http_request_duration_seconds Время ответа",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for view in sorted(counts):
+                for bound, count in zip(DURATION_BUCKETS, self.buckets[view]):
+                    lines.append(f'http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {counts[view]}')
+                lines.append(f'http_request_duration_seconds_sum{{view="{view}"}} {self.durations[view]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{view="{view}"}} {counts[view]}')
+            lines += [
+                "# HELP http_request_db_queries_total SQL-запросы при обработке запросов",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            lines += [
+                f'http_request_db_queries_total{{view="{view}"}} {count}'
+                for view, count in sorted(self.queries.items())
+            ]
+            lines += [
+                "# HELP http_request_phase_seconds_total Время этапов обработки: db, serialize, render, app и другие",
+                "# TYPE http_request_phase_seconds_total counter",
+            ]
+            lines += [
+                f'http_request_phase_seconds_total{{view="{view}",phase="{phase}"}} {duration:.6f}'
+                for (view, phase), duration in sorted(self.phases.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def get_view_name(request):
+    """Имя вьюхи запроса: класс и действие (HabitViewSet.list) или имя маршрута"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view_class = getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+    if view_class is None:
+        return match.view_name
+    actions = getattr(match.func, "actions", None)
+    action = actions.get(request.method.lower()) if actions else None
+    return f"{view_class.__name__}.{action or request.method.lower()}"
+
+
+class InstrumentationMiddleware:
+    """Замеряет долю запросов и добавляет к ответу заголовок Server-Timing"""
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.INSTRUMENTATION_SAMPLE_RATE
+        self.server_timing = settings.INSTRUMENTATION_SERVER_TIMING
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with connection.execute_wrapper(record_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - metrics.started
+        # Остальное время - код вьюхи вне замеренных этапов: аутентификация, права доступа
+        metrics.add("app", max(total - metrics.measured(), 0))
+        registry.observe(get_view_name(request), response.status_code, total, metrics.queries, metrics.phases)
+        if self.server_timing:
+            response["Server-Timing"] = self.format_server_timing(metrics, total)
+        return response
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после вьюхи: засекаем рендеринг до конца render()"""
+        metrics = _current.get()
+        if metrics is not None:
+            started, measured = time.perf_counter(), metrics.measured()
+            response.add_post_render_callback(lambda rendered: metrics.add_exclusive("render", started, measured))
+        return response
+
+    @staticmethod
+    def format_server_timing(metrics, total):
+        entries = [f'db;dur={metrics.phases.get("db", 0) * 1000:.2f};desc="{metrics.queries} queries"']
+        entries += [
+            f"{phase};dur={duration * 1000:.2f}" for phase, duration in metrics.phases.items() if phase != "db"
+        ]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def metrics(request):
+    """Счётчики процесса для Prometheus по заголовку Authorization: Bearer <METRICS_TOKEN>.
+    Без заданного METRICS_TOKEN вьюха недоступна, чтобы счётчики не оказались публичными"""
+    if not settings.INSTRUMENTATION_ENABLED or not settings.METRICS_TOKEN:
+        raise Http404
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -160,7 +161,7 @@ AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
@@ -171,6 +172,43 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Сколько секунд пользователь из JWT хранится в кеше аутентификации (users.authentication)
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Замеры запросов к API (config.instrumentation): доля замеряемых запросов, заголовок Server-Timing
+# и токен для /metrics/ (без токена счётчики не отдаются, /metrics/ отвечает 404)
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED") == "True"
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv("INSTRUMENTATION_SAMPLE_RATE", 1))
+INSTRUMENTATION_SERVER_TIMING = os.getenv("INSTRUMENTATION_SERVER_TIMING", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Кеш в Redis, который уже используется Celery; без CACHE_LOCATION - локальный кеш процесса.
+# Кеш аутентификации (AUTH_CACHE_ALIAS) есть только в общем Redis: локальный кеш нельзя сбросить
+# сразу во всех воркерах, поэтому без CACHE_LOCATION пользователь загружается из базы на каждый запрос
+CACHE_LOCATION = os.getenv("CACHE_LOCATION")
+AUTH_CACHE_ALIAS = "auth"
+
+if CACHE_LOCATION:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_LOCATION,
+        },
+        AUTH_CACHE_ALIAS: {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_LOCATION,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Время жизни закешированных страниц ленты публичных привычек в секундах
+PUBLIC_HABITS_CACHE_TIMEOUT = 60 * 60
+
 # URL-адрес брокера сообщений
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 
@@ -191,7 +229,19 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_BEAT_SCHEDULE = {
     "remind_habit": {
         "task": "habits.tasks.remind_habit",  # Путь к задаче
-        "schedule": crontab(minute='*'),  # Расписание выполнения задачи каждые 30 минут
+        "schedule": crontab(minute="*"),  # Расписание выполнения задачи каждые 30 минут
+    },
+    "deliver_reminders": {
+        "task": "habits.tasks.deliver_reminders",
+        "schedule": crontab(minute="*"),  # Повторная доставка напоминаний после сбоев каждую минуту
+    },
+    "rollup_completions": {
+        "task": "habits.tasks.rollup_completions",
+        "schedule": crontab(minute="*"),  # Обновление статистики выполнения привычек каждую минуту
+    },
+    "prune_reminders": {
+        "task": "habits.tasks.prune_reminders",
+        "schedule": crontab(minute=15),  # Очистка журнала и очереди напоминаний раз в час
     },
 }
 
@@ -209,3 +259,74 @@ CORS_ALLOW_ALL_ORIGINS = False
 TELEGRAM_URL = "https://api.telegram.org/bot"
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+
+# Таймауты запроса к API телеграма (подключение, чтение) в секундах
+TELEGRAM_TIMEOUT = (3.05, 10)
+
+# Количество одновременных запросов к API телеграма
+TELEGRAM_MAX_WORKERS = int(os.getenv("TELEGRAM_MAX_WORKERS", 16))
+
+# Ограничения телеграма: сообщений в секунду всего и в один чат
+TELEGRAM_RATE_LIMIT = int(os.getenv("TELEGRAM_RATE_LIMIT", 30))
+TELEGRAM_CHAT_RATE_LIMIT = 1
+
+# Количество повторов при ошибках сети, 5xx и 429
+TELEGRAM_MAX_RETRIES = 3
+
+# Каналы доставки напоминаний и канал для пользователей, не выбравших свой
+NOTIFICATION_TRANSPORTS = {
+    "telegram": "habits.transports.TelegramTransport",
+    "email": "habits.transports.EmailTransport",
+    "webhook": "habits.transports.WebhookTransport",
+    "local": "habits.transports.LocalTransport",
+}
+NOTIFICATION_DEFAULT_TRANSPORT = os.getenv("NOTIFICATION_DEFAULT_TRANSPORT", "telegram")
+
+# Таймаут запроса к вебхуку пользователя: (подключение, чтение) в секундах
+WEBHOOK_TIMEOUT = (3.05, 10)
+
+# Тема письма с напоминанием
+REMINDER_EMAIL_SUBJECT = "Напоминание о привычке"
+
+# Имитация задержки сети локального канала (для бенчмарков), секунды
+LOCAL_TRANSPORT_LATENCY = float(os.getenv("LOCAL_TRANSPORT_LATENCY", 0))
+
+# Почтовый сервер для канала Email
+EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", 25))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS") == "True"
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "webmaster@localhost")
+
+# Количество привычек в одной подзадаче отправки напоминаний
+REMINDER_BATCH_SIZE = 500
+
+# Сколько дней хранить журнал отправленных напоминаний (ReminderOccurrence)
+REMINDER_OCCURRENCE_RETENTION_DAYS = 2
+# Сколько строк удалять одним запросом при очистке
+PRUNE_BATCH_SIZE = 5000
+
+# Очередь исходящих напоминаний: размер пачки, число попыток доставки,
+# начальная и максимальная задержка повтора в секундах
+REMINDER_DELIVERY_BATCH_SIZE = 100
+REMINDER_DELIVERY_MAX_ATTEMPTS = 8
+REMINDER_DELIVERY_BACKOFF = 60
+REMINDER_DELIVERY_MAX_BACKOFF = 3600
+# Аренда забранной на отправку пачки в секундах: после неё пачку, не записавшую результат, забирает другой воркер.
+# Должна быть больше времени отправки пачки
+REMINDER_DELIVERY_LEASE = 600
+# Сколько дней хранить отправленные и недоставленные исходящие напоминания
+REMINDER_DELIVERY_RETENTION_DAYS = 30
+
+# Максимальное количество привычек в одном пакетном запросе
+HABITS_BULK_MAX_SIZE = 100
+
+# Списки привычек строятся из QuerySet.values() без экземпляров моделей и сериализатора
+HABITS_FAST_LIST = True
+
+# Сколько строк выгрузки (habits.export) читается из базы за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Количество отметок о выполнении, агрегируемых за одну транзакцию
+ROLLUP_BATCH_SIZE = 5000
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from habits.models import Habit, Place
+from habits.models import DeadRecipient, Habit, Place, ReminderDelivery
 
 
 @admin.register(Habit)
@@ -31,3 +31,31 @@ class PlaceAdmin(admin.ModelAdmin):
         "name",
         "description",
     )
+
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    """Класс администрирования очереди исходящих напоминаний"""
+
+    list_display = (
+        "id",
+        "transport",
+        "recipient",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at",
+    )
+    list_filter = ("status", "transport")
+
+
+@admin.register(DeadRecipient)
+class DeadRecipientAdmin(admin.ModelAdmin):
+    """Класс администрирования недоступных получателей: удаление записи возобновляет доставку"""
+
+    list_display = (
+        "transport",
+        "recipient",
+        "reason",
+        "created_at",
+    )
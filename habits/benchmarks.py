@@ -0,0 +1,148 @@
+"""
+Общие инструменты бенчмарков и планов запросов.
+
+Тестовые данные создаются внутри транзакции, которая откатывается после замеров,
+поэтому команды можно запускать на рабочей базе разработчика.
+"""
+
+import json
+import statistics
+import threading
+import time as time_module
+from contextlib import contextmanager
+from datetime import time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.scheduling import get_next_fire_at
+from users.models import User
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class Rollback(Exception):
+    """Откат тестовых данных после замеров"""
+
+
+@contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции и откатывает все изменения"""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed_habits(count, habits_per_user=100, now=None, first_minute=0, minutes=MINUTES_PER_DAY, **user_fields):
+    """Тестовые пользователи и привычки: время выполнения равномерно покрывает minutes минут суток,
+    начиная с first_minute (по умолчанию - все сутки), каждая десятая привычка публичная.
+    У каждого пользователя свой телеграм chat_id. Возвращает созданных пользователей"""
+    now = now or timezone.now()
+    users = User.objects.bulk_create(
+        (
+            User(email=f"bench-{number}@example.com", tg_chat_id=str(number), **user_fields)
+            for number in range((count + habits_per_user - 1) // habits_per_user)
+        ),
+        batch_size=1000,
+    )
+    habits = []
+    for number in range(count):
+        minute = (first_minute + number % minutes) % MINUTES_PER_DAY
+        execution_time = time(minute // 60, minute % 60)
+        habits.append(
+            Habit(
+                owner=users[number // habits_per_user],
+                action=f"Привычка {number}",
+                execution_time=execution_time,
+                next_fire_at=get_next_fire_at(execution_time, now),
+                is_published=number % 10 == 0,
+            )
+        )
+    Habit.objects.bulk_create(habits, batch_size=1000)
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Habit._meta.db_table}")
+    return users
+
+
+def measure(func, repeat):
+    """Вызывает func repeat раз, возвращает результат последнего вызова и длительности в миллисекундах"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time_module.perf_counter()
+        result = func()
+        durations.append((time_module.perf_counter() - started) * 1000)
+    return result, durations
+
+
+def summarize(durations):
+    """Медиана, 99-й перцентиль и максимум длительностей в миллисекундах"""
+    ordered = sorted(durations)
+    return {
+        "p50": round(statistics.median(ordered), 3),
+        "p99": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def next_midnight(now=None):
+    """Ближайшая полночь по времени сервера"""
+    now = timezone.localtime(now)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+def minute_of_day(moment):
+    """Минута суток момента по времени сервера"""
+    moment = timezone.localtime(moment)
+    return moment.hour * 60 + moment.minute
+
+
+class FakeTelegramServer:
+    """Локальный HTTP-сервер, отвечающий как метод sendMessage телеграма, с задержкой latency секунд.
+    Используется как контекстный менеджер, адрес метода - в атрибуте url"""
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Соединения переиспользуются, как с настоящим API телеграма
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело ответа пишутся отдельно: без TCP_NODELAY каждый ответ ждёт отложенного ACK
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if server.latency:
+                    time_module.sleep(server.latency)
+                with server.lock:
+                    server.requests += 1
+                body = json.dumps({"ok": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/sendMessage"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
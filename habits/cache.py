@@ -0,0 +1,33 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# Поколение ленты публичных привычек: все страницы ленты кешируются под текущим поколением,
+# поэтому смена поколения разом делает их устаревшими
+PUBLIC_FEED_VERSION_KEY = "public-habits:version"
+
+
+def get_public_feed_version():
+    """Текущее поколение ленты публичных привычек"""
+    version = cache.get(PUBLIC_FEED_VERSION_KEY)
+    if version is None:
+        # После вытеснения ключа начинаем с метки времени, чтобы не совпасть со старыми поколениями
+        cache.add(PUBLIC_FEED_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(PUBLIC_FEED_VERSION_KEY)
+    return version
+
+
+def bump_public_feed_version():
+    """Сбрасывает закешированную ленту публичных привычек"""
+    try:
+        cache.incr(PUBLIC_FEED_VERSION_KEY)
+    except ValueError:
+        get_public_feed_version()
+
+
+def get_public_feed_cache_key(request):
+    """Ключ кеша и ETag страницы ленты: поколение ленты, адрес запроса и формат ответа"""
+    version = get_public_feed_version()
+    digest = hashlib.md5(f"{request.accepted_media_type}:{request.get_full_path()}".encode()).hexdigest()
+    return f"public-habits:{version}:{digest}", f'"{version}-{digest}"'
@@ -0,0 +1,108 @@
+"""
+Потоковая выгрузка привычек и истории выполнений в NDJSON или CSV.
+
+Строки читаются QuerySet.values().iterator() пачками по EXPORT_CHUNK_SIZE (на PostgreSQL - через серверный
+курсор), переводятся в словари тем же скомпилированным представлением сериализатора, что и списки API,
+и сразу кодируются, поэтому память не зависит от количества строк. Сжатие gzip выполняется на лету.
+"""
+
+import csv
+import zlib
+
+from config import settings
+from habits.renderers import FastJSONRenderer
+from habits.serializers import HabitCompletionExportSerializer, HabitSerializer, compile_row_serializer
+
+# Наборы данных: сериализатор строки и поле, по которому отбираются данные владельца
+EXPORT_DATASETS = {
+    "habits": (HabitSerializer, "owner"),
+    "completions": (HabitCompletionExportSerializer, "habit__owner"),
+}
+
+# Форматы выгрузки: MIME-тип и расширение файла
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+# Начала значений, с которых электронные таблицы начинают формулу
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# Размер блока, которым выгрузка отдаётся клиенту, в байтах
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_export_rows(dataset, owner=None):
+    """Названия полей и итератор строк набора данных (всех пользователей или одного владельца)"""
+    serializer_class, owner_lookup = EXPORT_DATASETS[dataset]
+    serializer = serializer_class()
+    columns, to_dict = compile_row_serializer(serializer)
+    names = [name for name, field in serializer.fields.items() if not field.write_only]
+
+    queryset = serializer_class.Meta.model.objects.order_by("id")
+    if owner is not None:
+        queryset = queryset.filter(**{owner_lookup: owner})
+    rows = queryset.values(*columns).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    return names, (to_dict(row) for row in rows)
+
+
+def encode_ndjson(names, rows):
+    """Строка - объект JSON, как в ответах API"""
+    renderer = FastJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b"\n"
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def escape_csv_formula(value):
+    """Строка, которую электронная таблица примет за формулу, экранируется апострофом (CSV injection)"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def encode_csv(names, rows):
+    """Первая строка - заголовок с названиями полей"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(names).encode()
+    for row in rows:
+        yield writer.writerow([escape_csv_formula(row[name]) for name in names]).encode()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Склеивает мелкие части в блоки не меньше size байт"""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzipped(chunks):
+    """Сжимает поток блоков в формат gzip"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(dataset, export_format, owner=None, gzip=False):
+    """Поток байтов выгрузки набора данных в заданном формате"""
+    names, rows = iter_export_rows(dataset, owner)
+    chunks = buffered(ENCODERS[export_format](names, rows))
+    return gzipped(chunks) if gzip else chunks
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from config import settings
+from habits.stats import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """Пересчитывает агрегированную статистику выполнения привычек по всей истории отметок.
+    Нужна после первого развёртывания статистики и для восстановления агрегатов"""
+
+    help = "Пересчёт дневной и недельной статистики выполнения привычек"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ROLLUP_BATCH_SIZE, help="Отметок в одной транзакции"
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Учтено отметок о выполнении: {total}"))
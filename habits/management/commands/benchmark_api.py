@@ -0,0 +1,179 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from config import settings
+from habits.benchmarks import measure, rolled_back, seed_habits, summarize
+from habits.cache import bump_public_feed_version
+from habits.models import Place
+
+# Бюджеты эндпоинтов: запросов к базе на один вызов и 99-й перцентиль времени ответа в миллисекундах.
+# Запросы не зависят от объёма данных, поэтому их бюджет точный; время - с запасом на медленные машины
+BUDGETS = {
+    "my-habits-list": {"queries": 2, "p99": 50},
+    "my-habits-list-cursor": {"queries": 1, "p99": 50},
+    "my-habits-list-expanded": {"queries": 2, "p99": 50},
+    "my-habits-retrieve": {"queries": 1, "p99": 50},
+    "my-habits-create": {"queries": 1, "p99": 50},
+    "public-habits-list": {"queries": 0, "p99": 30},
+    "public-habits-list-cold": {"queries": 2, "p99": 50},
+    "places-list": {"queries": 1, "p99": 50},
+    # Основное время входа - хеширование пароля, оно намеренно медленное
+    "users-login": {"queries": 1, "p99": 1500},
+}
+
+
+class Command(BaseCommand):
+    """Бенчмарк API привычек и пользователей: вызывает эндпоинты через тестовый клиент
+    на тестовых данных заданного объёма (откатываются) и проверяет бюджеты BUDGETS
+    по количеству запросов к базе и 99-му перцентилю времени ответа.
+
+    Отчёт в формате JSON (--output) служит эталоном для следующих запусков: с --baseline
+    команда сравнивает результаты с эталоном и завершается ошибкой, если выросло количество
+    запросов или p99 ухудшился больше чем на --max-regression процентов:
+    python manage.py benchmark_api --habits 100000 --output api.json
+    python manage.py benchmark_api --habits 100000 --baseline api.json"""
+
+    help = "Бенчмарк задержки и количества запросов эндпоинтов привычек и пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--habits", type=int, default=10000, help="Количество тестовых привычек")
+        parser.add_argument("--habits-per-user", type=int, default=100, help="Привычек на пользователя")
+        parser.add_argument("--places", type=int, default=50, help="Количество тестовых мест")
+        parser.add_argument("--repeat", type=int, default=30, help="Вызовов каждого эндпоинта")
+        parser.add_argument("--baseline", help="Эталонный отчёт для сравнения")
+        parser.add_argument("--max-regression", type=float, default=20, help="Допустимый рост p99 к эталону, %%")
+        parser.add_argument("--queries-only", action="store_true", help="Проверять только бюджеты запросов")
+        parser.add_argument("--format", choices=["text", "json"], default="text", help="Формат отчёта")
+        parser.add_argument("--output", help="Файл для отчёта в формате JSON")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        # Тестовый клиент обращается к хосту testserver. Бюджеты рассчитаны на общий кеш аутентификации;
+        # без CACHE_LOCATION его заменяет локальный кеш - в одном процессе бенчмарка он сбрасывается корректно
+        caches = {settings.AUTH_CACHE_ALIAS: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        caches.update(settings.CACHES)
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], CACHES=caches), rolled_back():
+            endpoints = self.run_endpoints(options)
+
+        report = {
+            "benchmark": "api",
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "habits": options["habits"],
+            "repeat": options["repeat"],
+            "endpoints": endpoints,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+
+        violations = self.check_budgets(endpoints, options["queries_only"])
+        if baseline:
+            violations += self.compare(endpoints, baseline, options["max_regression"])
+        self.write_report(report, baseline, options["format"])
+        if violations:
+            raise CommandError("Бюджеты превышены:\n" + "\n".join(violations))
+
+    def run_endpoints(self, options):
+        users = seed_habits(options["habits"], habits_per_user=options["habits_per_user"])
+        owner = users[0]
+        owner.set_password("benchmark")
+        owner.save(update_fields=["password"])
+        Place.objects.bulk_create(Place(name=f"bench-place-{number}") for number in range(options["places"]))
+        habit = owner.habit_set.order_by("id").first()
+
+        client = APIClient()
+        response = client.post(reverse("users:login"), {"email": owner.email, "password": "benchmark"})
+        token = response.data["access"]
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+        list_url = reverse("habits:my-habits-list")
+        public_url = reverse("habits:public-habits-list")
+        scenarios = {
+            "my-habits-list": lambda: client.get(list_url, **auth),
+            "my-habits-list-cursor": lambda: client.get(list_url, {"pagination": "cursor"}, **auth),
+            "my-habits-list-expanded": lambda: client.get(
+                list_url, {"expand": "place,habit_related", "fields": "id,action,execution_time,place"}, **auth
+            ),
+            "my-habits-retrieve": lambda: client.get(reverse("habits:my-habits-detail", args=[habit.pk]), **auth),
+            "my-habits-create": lambda: client.post(
+                list_url, {"action": "Новая привычка", "periodicity": 1, "time_required": 60}, format="json", **auth
+            ),
+            "public-habits-list": lambda: client.get(public_url),
+            "public-habits-list-cold": lambda: bump_public_feed_version() or client.get(public_url),
+            "places-list": lambda: client.get(reverse("habits:places-list"), **auth),
+            "users-login": lambda: client.post(
+                reverse("users:login"), {"email": owner.email, "password": "benchmark"}
+            ),
+        }
+
+        results = {}
+        for name, request in scenarios.items():
+            # Первый вызов прогревает кеши, второй - считает запросы к базе, остальные - время ответа
+            request()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            if response.status_code >= 400:
+                raise CommandError(f"{name}: ответ {response.status_code} {response.content[:200]!r}")
+            results[name] = {"status": response.status_code, "queries": len(queries)}
+            _, durations = measure(request, options["repeat"])
+            results[name].update(summarize(durations))
+        return results
+
+    @staticmethod
+    def check_budgets(endpoints, queries_only):
+        violations = []
+        for name, result in endpoints.items():
+            budget = BUDGETS[name]
+            if result["queries"] > budget["queries"]:
+                violations.append(f"{name}: {result['queries']} запросов, бюджет {budget['queries']}")
+            if not queries_only and result["p99"] > budget["p99"]:
+                violations.append(f"{name}: p99 {result['p99']} мс, бюджет {budget['p99']} мс")
+        return violations
+
+    @staticmethod
+    def compare(endpoints, baseline, max_regression):
+        violations = []
+        for name, result in endpoints.items():
+            base = baseline["endpoints"].get(name)
+            if base is None:
+                continue
+            if result["queries"] > base["queries"]:
+                violations.append(f"{name}: {result['queries']} запросов, в эталоне {base['queries']}")
+            if result["p99"] > base["p99"] * (1 + max_regression / 100):
+                violations.append(f"{name}: p99 {result['p99']} мс, в эталоне {base['p99']} мс")
+        return violations
+
+    def write_report(self, report, baseline, output_format):
+        if output_format == "json":
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        base_endpoints = baseline["endpoints"] if baseline else {}
+        for name, result in report["endpoints"].items():
+            line = f"{name}: {result['queries']} запросов, p50 {result['p50']} мс, p99 {result['p99']} мс"
+            base = base_endpoints.get(name)
+            if base:
+                line += (
+                    f" (эталон: {base['queries']} запросов, p50 {self.delta(result['p50'], base['p50'])},"
+                    f" p99 {self.delta(result['p99'], base['p99'])})"
+                )
+            self.stdout.write(line)
+
+    @staticmethod
+    def delta(value, base):
+        if not base:
+            return "-"
+        return f"{(value - base) / base * 100:+.1f}%"
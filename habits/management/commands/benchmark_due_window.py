@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from habits.benchmarks import (
+    MINUTES_PER_DAY,
+    measure,
+    minute_of_day,
+    next_midnight,
+    rolled_back,
+    seed_habits,
+    summarize,
+)
+from habits.scheduling import REMINDER_LEAD, due_habits
+
+
+class Command(BaseCommand):
+    """Замеряет запрос окна напоминаний (due_habits) на тестовых данных, в том числе для окна,
+    пересекающего полночь. Заодно проверяет, что в каждое окно попадают все привычки,
+    время выполнения которых в него входит: python manage.py benchmark_due_window --habits 100000"""
+
+    help = "Бенчмарк запроса окна напоминаний около полуночи и в середине дня"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--habits", type=int, default=10000, help="Количество тестовых привычек (откатываются)")
+        parser.add_argument("--repeat", type=int, default=50, help="Количество замеров на окно")
+
+    def handle(self, *args, **options):
+        if options["habits"] < MINUTES_PER_DAY:
+            raise CommandError(f"Нужно не меньше {MINUTES_PER_DAY} привычек, чтобы покрыть все минуты суток")
+
+        now = timezone.now()
+        # Окна целиком в будущем: привычки до начала окна уже сдвинуты на следующие сутки
+        midnight = next_midnight(now + REMINDER_LEAD)
+        noon = next_midnight(now + REMINDER_LEAD - timedelta(hours=12)) + timedelta(hours=12)
+        windows = {
+            "23:55-00:05": midnight,
+            "23:58-00:08": midnight + timedelta(minutes=3),
+            "11:55-12:05": noon,
+        }
+        with rolled_back():
+            seed_habits(options["habits"], now=now)
+            for name, moment in windows.items():
+                start, end = moment - REMINDER_LEAD, moment + REMINDER_LEAD
+                queryset = due_habits(start, end, now=now).values_list("id", flat=True)
+                due, durations = measure(lambda: len(list(queryset.all())), options["repeat"])
+
+                # Привычки распределены по минутам суток равномерно: в окно попадает своя доля
+                minutes = int((end - start).total_seconds() // 60)
+                first_minute = minute_of_day(start)
+                expected = sum(
+                    1 for number in range(options["habits"]) if (number - first_minute) % MINUTES_PER_DAY < minutes
+                )
+                timings = summarize(durations)
+                style = self.style.SUCCESS if due == expected else self.style.ERROR
+                self.stdout.write(
+                    style(
+                        f"{name}: {due}/{expected} привычек, "
+                        f"p50 {timings['p50']} мс, p99 {timings['p99']} мс, max {timings['max']} мс"
+                    )
+                )
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from habits.benchmarks import measure, rolled_back, seed_habits, summarize
+from habits.models import Habit, Place
+from habits.renderers import FastJSONRenderer
+from habits.serializers import HabitSerializer, get_habit_row_serializer
+
+
+class Command(BaseCommand):
+    """Сравнивает построение списка привычек сериализатором (HabitSerializer + JSONRenderer)
+    и быстрым путём (values() + скомпилированное представление + FastJSONRenderer) на тестовых данных,
+    проверяя, что ответы совпадают байт в байт: python manage.py benchmark_habit_list --habits 10000 --rows 1000"""
+
+    help = "Бенчмарк быстрого пути списка привычек против сериализатора"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--habits", type=int, default=10000, help="Количество тестовых привычек (откатываются)")
+        parser.add_argument("--rows", type=int, default=1000, help="Привычек в одном списке")
+        parser.add_argument("--repeat", type=int, default=20, help="Количество замеров")
+
+    def handle(self, *args, **options):
+        variants = {
+            "все поля": {"fields": None, "expand": ()},
+            "expand=place,habit_related": {"fields": None, "expand": ("habit_related", "place")},
+            "fields=id,action,execution_time": {"fields": ("action", "execution_time", "id"), "expand": ()},
+        }
+        with rolled_back():
+            self.seed(options["habits"])
+            for name, representation in variants.items():
+                self.compare(name, representation, options["rows"], options["repeat"])
+
+    @staticmethod
+    def seed(count):
+        seed_habits(count)
+        place = Place.objects.create(name="bench-place")
+        pleasant = Habit.objects.create(action="bench-pleasant", is_pleasant=True)
+        Habit.objects.exclude(pk=pleasant.pk).update(place=place, habit_related=pleasant, reward=None)
+
+    def compare(self, name, representation, rows, repeat):
+        fields, expand = representation["fields"], representation["expand"]
+        queryset = Habit.objects.order_by("id")
+        if expand:
+            queryset = queryset.select_related(*expand)
+        columns = HabitSerializer.get_read_columns(fields, expand)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+
+        def serializer_path():
+            serializer = HabitSerializer(list(queryset[:rows]), many=True, context=representation)
+            return JSONRenderer().render(serializer.data)
+
+        def fast_path():
+            row_columns, to_dict = get_habit_row_serializer(fields, expand)
+            return FastJSONRenderer().render([to_dict(row) for row in queryset.values(*row_columns)[:rows]])
+
+        expected, serializer_durations = measure(serializer_path, repeat)
+        content, fast_durations = measure(fast_path, repeat)
+        if content != expected:
+            raise CommandError(f"{name}: ответы быстрого пути и сериализатора различаются")
+
+        serializer_timings, fast_timings = summarize(serializer_durations), summarize(fast_durations)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name}, {rows} привычек, {len(content)} байт"))
+        self.stdout.write(f"  сериализатор: p50 {serializer_timings['p50']} мс, p99 {serializer_timings['p99']} мс")
+        self.stdout.write(f"  быстрый путь: p50 {fast_timings['p50']} мс, p99 {fast_timings['p99']} мс")
+        self.stdout.write(f"  ускорение: {serializer_timings['p50'] / fast_timings['p50']:.1f}x")
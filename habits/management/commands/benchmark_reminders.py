@@ -0,0 +1,147 @@
+import json
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from config import celery_app, settings
+from habits.benchmarks import FakeTelegramServer, minute_of_day, rolled_back, seed_habits
+from habits.models import Habit, ReminderDelivery
+from habits.outbox import drain_outbox
+from habits.services import TelegramSender
+from habits.tasks import remind_habit
+from habits.transports import LocalTransport, TelegramTransport, set_transport
+
+
+class Command(BaseCommand):
+    """Бенчмарк конвейера напоминаний: запуск remind_habit и доставка очереди исходящих
+    на тестовых данных заданного объёма, без обращения к внешним сервисам.
+
+    Телеграм заменяется локальным HTTP-сервером (--transport telegram) или локальным каналом
+    без сети (--transport local), задержка ответа задаётся --latency. Для каждого этапа выводятся
+    количество запросов к базе, время, пиковая память (tracemalloc) и скорость доставки.
+    Результат в формате JSON (--format json, --output) удобно сохранять и сравнивать между релизами:
+    python manage.py benchmark_reminders --habits 100000 --latency 20 --format json --output reminders.json"""
+
+    help = "Бенчмарк задачи напоминаний и доставки сообщений"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--habits", type=int, default=10000, help="Количество привычек, о которых пора напомнить")
+        parser.add_argument("--habits-per-user", type=int, default=10, help="Привычек на пользователя")
+        parser.add_argument("--transport", choices=["telegram", "local"], default="telegram", help="Канал доставки")
+        parser.add_argument("--latency", type=float, default=0, help="Задержка ответа канала, мс")
+        parser.add_argument("--workers", type=int, default=settings.TELEGRAM_MAX_WORKERS, help="Потоков отправки")
+        parser.add_argument("--no-memory", action="store_true", help="Не замерять память (tracemalloc замедляет)")
+        parser.add_argument("--format", choices=["text", "json"], default="text", help="Формат отчёта")
+        parser.add_argument("--output", help="Файл для отчёта в формате JSON")
+
+    def handle(self, *args, **options):
+        self.trace_memory = not options["no_memory"]
+        latency = options["latency"] / 1000
+        # Все привычки наступают через минуту: тик задачи напоминаний обрабатывает их целиком
+        now = timezone.now()
+        first_minute = minute_of_day(now + timedelta(minutes=1))
+
+        server = FakeTelegramServer(latency) if options["transport"] == "telegram" else None
+        with server or nullcontext(), self.eager_celery(), rolled_back():
+            transport = self.install_transport(options, server, latency)
+            users = seed_habits(
+                options["habits"],
+                habits_per_user=options["habits_per_user"],
+                now=now,
+                first_minute=first_minute,
+                minutes=1,
+                notification_transport=options["transport"],
+            )
+            # Заполнение большой базы занимает минуты: переносим напоминания в окно ближайшего тика
+            Habit.objects.filter(owner_id__gte=users[0].pk, owner_id__lte=users[-1].pk).update(
+                next_fire_at=timezone.now() + timedelta(minutes=1)
+            )
+            tick = self.measure(remind_habit)
+            queued = ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_PENDING).count()
+            delivery = self.measure(self.drain)
+            delivery["messages"] = queued
+            delivery["messages_per_second"] = round(queued / delivery["wall_s"], 1) if delivery["wall_s"] else None
+            delivery["transport_requests"] = server.requests if server else transport.requests
+
+        set_transport(options["transport"], None)
+        report = {
+            "benchmark": "reminders",
+            "timestamp": now.isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "habits": options["habits"],
+            "habits_per_user": options["habits_per_user"],
+            "transport": options["transport"],
+            "latency_ms": options["latency"],
+            "workers": options["workers"],
+            "tick": tick,
+            "delivery": delivery,
+        }
+        self.write_report(report, options)
+
+    @staticmethod
+    @contextmanager
+    def eager_celery():
+        """Подзадачи выполняются синхронно в этом же процессе, без брокера"""
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            yield
+        finally:
+            celery_app.conf.task_always_eager = always_eager
+
+    @staticmethod
+    def install_transport(options, server, latency):
+        """Подменяет канал доставки на локальный, без ограничений частоты"""
+        if server:
+            sender = TelegramSender(
+                server.url,
+                max_workers=options["workers"],
+                rate_limit=10**9,
+                chat_rate_limit=10**9,
+                max_retries=0,
+            )
+            transport = TelegramTransport(sender)
+        else:
+            transport = LocalTransport(latency=latency)
+        set_transport(options["transport"], transport)
+        return transport
+
+    @staticmethod
+    def drain():
+        while drain_outbox(settings.REMINDER_DELIVERY_BATCH_SIZE):
+            pass
+
+    def measure(self, func):
+        """Запросы к базе, время и пиковая память одного выполнения func"""
+        if self.trace_memory:
+            tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            wall = time.perf_counter() - started
+        result = {"queries": len(queries), "wall_s": round(wall, 3)}
+        if self.trace_memory:
+            result["peak_memory_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        return result
+
+    def write_report(self, report, options):
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for stage in ("tick", "delivery"):
+            self.stdout.write(self.style.MIGRATE_HEADING(stage))
+            for key, value in report[stage].items():
+                self.stdout.write(f"  {key}: {value}")
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from habits.export import EXPORT_DATASETS, EXPORT_FORMATS, stream_export
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Потоковая выгрузка привычек или истории выполнений всех пользователей (или одного --owner)
+    для аналитики, без загрузки всех строк в память:
+    python manage.py export_habits --dataset completions --format csv --gzip --output completions.csv.gz"""
+
+    help = "Выгрузка привычек или истории выполнений в NDJSON или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", choices=sorted(EXPORT_DATASETS), default="habits", help="Набор данных")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson", help="Формат выгрузки")
+        parser.add_argument("--owner", help="Email владельца; по умолчанию - все пользователи")
+        parser.add_argument("--output", help="Файл для выгрузки; по умолчанию - стандартный вывод")
+        parser.add_argument("--gzip", action="store_true", help="Сжать выгрузку gzip")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(email=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        chunks = stream_export(options["dataset"], options["format"], owner=owner, gzip=options["gzip"])
+        if not options["output"]:
+            self.write(chunks, sys.stdout.buffer)
+            return
+        with open(options["output"], "wb") as file:
+            self.write(chunks, file)
+
+    @staticmethod
+    def write(chunks, file):
+        for chunk in chunks:
+            file.write(chunk)
+        file.flush()
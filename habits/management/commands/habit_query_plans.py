@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from habits.benchmarks import rolled_back, seed_habits
+from habits.models import Habit
+from habits.scheduling import REMINDER_LEAD, due_habits
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Выводит планы выполнения (EXPLAIN) самых нагруженных запросов к привычкам.
+    Запустите команду до и после миграции с индексами, чтобы сравнить планы:
+    python manage.py migrate habits 0003 && python manage.py habit_query_plans --seed 100000
+    python manage.py migrate habits && python manage.py habit_query_plans --seed 100000"""
+
+    help = "Планы выполнения запросов списка привычек, публичной ленты и окна напоминаний"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Создать N тестовых привычек (откатываются)")
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (только PostgreSQL)")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            if options["seed"]:
+                seed_habits(options["seed"])
+            self.explain(options["analyze"])
+
+    def explain(self, analyze):
+        options = {"analyze": True} if analyze and connection.vendor == "postgresql" else {}
+        owner = User.objects.order_by("id").first()
+        now = timezone.now()
+        queries = {
+            "HabitViewSet.list": Habit.objects.filter(owner=owner).order_by("id")[:5],
+            "PublicHabitViewSet.list": Habit.objects.filter(is_published=True).order_by("id")[:5],
+            "remind_habit": due_habits(now - REMINDER_LEAD, now + REMINDER_LEAD, now=now).values_list("id"),
+        }
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**options))
+            self.stdout.write("")
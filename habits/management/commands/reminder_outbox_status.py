@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from habits.outbox import get_outbox_stats
+
+
+class Command(BaseCommand):
+    """Выводит состояние очереди исходящих напоминаний: после сбоя телеграма видно,
+    сколько напоминаний ждёт доставки и как давно"""
+
+    help = "Состояние очереди исходящих напоминаний"
+
+    def handle(self, *args, **options):
+        stats = get_outbox_stats()
+        age = stats["oldest_pending_age"]
+        self.stdout.write(f"Ожидают доставки: {stats['pending']} (к отправке сейчас: {stats['due']})")
+        self.stdout.write(f"Отправляются: {stats['sending']}")
+        self.stdout.write(f"Самой старой ожидающей доставке: {'-' if age is None else f'{age:.0f} с'}")
+        self.stdout.write(f"Не доставлено: {stats['failed']}")
+        self.stdout.write(f"Недоступных получателей: {stats['dead_recipients']}")
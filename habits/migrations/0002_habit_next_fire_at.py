@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Сколько привычек читать и обновлять за раз
+BATCH_SIZE = 1000
+
+
+def get_next_fire_at(execution_time, now):
+    """Ближайший момент execution_time не раньше now в часовом поясе сервера.
+    Копия habits.scheduling.get_next_fire_at на момент миграции: миграция не должна зависеть
+    от того, как расписание считается в следующих версиях"""
+    day = timezone.localtime(now).date()
+    fire_at = timezone.make_aware(datetime.combine(day, execution_time))
+    if fire_at < now:
+        fire_at = timezone.make_aware(datetime.combine(day + timedelta(days=1), execution_time))
+    return fire_at
+
+
+def fill_next_fire_at(apps, schema_editor):
+    """Рассчитываем расписание напоминаний для уже существующих привычек, пачками по BATCH_SIZE"""
+    Habit = apps.get_model("habits", "Habit")
+    now = timezone.now()
+    rows = (
+        Habit.objects.filter(owner__isnull=False, execution_time__isnull=False)
+        .values_list("id", "execution_time")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for pk, execution_time in rows:
+        batch.append(Habit(id=pk, next_fire_at=get_next_fire_at(execution_time, now)))
+        if len(batch) == BATCH_SIZE:
+            Habit.objects.bulk_update(batch, ["next_fire_at"])
+            batch = []
+    if batch:
+        Habit.objects.bulk_update(batch, ["next_fire_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Момент ближайшего напоминания о привычке, рассчитывается автоматически",
+                null=True,
+                verbose_name="Следующее напоминание",
+            ),
+        ),
+        migrations.RunPython(fill_next_fire_at, migrations.RunPython.noop),
+    ]
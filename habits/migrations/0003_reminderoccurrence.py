@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0002_habit_next_fire_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderOccurrence",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "scheduled_for",
+                    models.DateTimeField(
+                        help_text="Момент выполнения привычки, о котором отправлено напоминание",
+                        verbose_name="Момент выполнения",
+                    ),
+                ),
+                (
+                    "claim",
+                    models.UUIDField(
+                        db_index=True,
+                        help_text="Идентификатор запуска задачи, захватившего отправку напоминания",
+                        verbose_name="Запуск задачи",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reminders",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Напоминание",
+                "verbose_name_plural": "Напоминания",
+                "constraints": [
+                    models.UniqueConstraint(fields=("habit", "scheduled_for"), name="unique_habit_reminder")
+                ],
+            },
+        ),
+    ]
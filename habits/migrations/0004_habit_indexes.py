@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0003_reminderoccurrence"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Новые индексы создаются раньше, чем удаляются заменяемые ими одиночные
+    operations = [
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(fields=["owner", "id"], name="habit_owner_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(condition=models.Q(("is_published", True)), fields=["id"], name="habit_published_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("owner__isnull", False)), fields=["next_fire_at"], name="habit_owned_next_fire_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Момент ближайшего напоминания о привычке, рассчитывается автоматически",
+                null=True,
+                verbose_name="Следующее напоминание",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="owner",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                help_text="Укажите владельца привычки",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец привычки",
+            ),
+        ),
+    ]
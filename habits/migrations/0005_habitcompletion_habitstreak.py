@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0004_habit_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HabitStreak",
+            fields=[
+                (
+                    "habit",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="streak",
+                        serialize=False,
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+                (
+                    "current_streak",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Количество выполнений подряд без пропуска периода",
+                        verbose_name="Текущая серия",
+                    ),
+                ),
+                ("longest_streak", models.PositiveIntegerField(default=0, verbose_name="Лучшая серия")),
+                ("last_completed_on", models.DateField(blank=True, null=True, verbose_name="Последнее выполнение")),
+                ("total_completions", models.PositiveIntegerField(default=0, verbose_name="Всего выполнений")),
+            ],
+            options={
+                "verbose_name": "Серия выполнения привычки",
+                "verbose_name_plural": "Серии выполнения привычек",
+            },
+        ),
+        migrations.CreateModel(
+            name="HabitCompletion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "completed_on",
+                    models.DateField(help_text="День, в который привычка выполнена", verbose_name="Дата выполнения"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="completions",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выполнение привычки",
+                "verbose_name_plural": "Выполнения привычек",
+                "constraints": [
+                    models.UniqueConstraint(fields=("habit", "completed_on"), name="unique_habit_completion")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_habitcompletion_habitstreak"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="Название")),
+                ("last_id", models.BigIntegerField(default=0, verbose_name="Последний учтённый id")),
+            ],
+            options={
+                "verbose_name": "Отметка агрегации",
+                "verbose_name_plural": "Отметки агрегации",
+            },
+        ),
+        migrations.CreateModel(
+            name="CompletionRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "День"), ("week", "Неделя")], max_length=4, verbose_name="Период"
+                    ),
+                ),
+                (
+                    "period_start",
+                    models.DateField(help_text="День или понедельник недели", verbose_name="Начало периода"),
+                ),
+                ("completions", models.PositiveIntegerField(default=0, verbose_name="Количество выполнений")),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="completion_rollups",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="completion_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец привычки",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выполнения привычки за период",
+                "verbose_name_plural": "Выполнения привычек за период",
+                "indexes": [models.Index(fields=["owner", "period", "period_start"], name="rollup_owner_period_idx")],
+                "constraints": [
+                    models.UniqueConstraint(fields=("habit", "period", "period_start"), name="unique_habit_rollup")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="OwnerCompletionRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "День"), ("week", "Неделя")], max_length=4, verbose_name="Период"
+                    ),
+                ),
+                (
+                    "period_start",
+                    models.DateField(help_text="День или понедельник недели", verbose_name="Начало периода"),
+                ),
+                ("completions", models.PositiveIntegerField(default=0, verbose_name="Количество выполнений")),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="owner_completion_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выполнения пользователя за период",
+                "verbose_name_plural": "Выполнения пользователей за период",
+                "constraints": [
+                    models.UniqueConstraint(fields=("owner", "period", "period_start"), name="unique_owner_rollup")
+                ],
+            },
+        ),
+    ]
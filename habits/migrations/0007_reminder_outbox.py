@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_completion_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeadRecipient",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "recipient",
+                    models.CharField(
+                        help_text="Телеграм chat_id получателя", max_length=50, unique=True, verbose_name="Получатель"
+                    ),
+                ),
+                ("reason", models.TextField(blank=True, default="", verbose_name="Причина")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+            ],
+            options={
+                "verbose_name": "Недоступный получатель",
+                "verbose_name_plural": "Недоступные получатели",
+            },
+        ),
+        migrations.CreateModel(
+            name="ReminderDelivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "recipient",
+                    models.CharField(
+                        help_text="Телеграм chat_id получателя", max_length=50, verbose_name="Получатель"
+                    ),
+                ),
+                ("text", models.TextField(verbose_name="Текст сообщения")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Ожидает отправки"), ("sent", "Отправлено"), ("failed", "Не доставлено")],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Попыток отправки")),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now, verbose_name="Следующая попытка"),
+                ),
+                ("last_error", models.TextField(blank=True, default="", verbose_name="Последняя ошибка")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                ("sent_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата отправки")),
+                (
+                    "habit",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="deliveries",
+                        to="habits.habit",
+                        verbose_name="Привычка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Исходящее напоминание",
+                "verbose_name_plural": "Исходящие напоминания",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["next_attempt_at"],
+                        name="delivery_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0007_reminder_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deadrecipient",
+            name="transport",
+            field=models.CharField(default="telegram", max_length=20, verbose_name="Канал доставки"),
+        ),
+        migrations.AddField(
+            model_name="reminderdelivery",
+            name="transport",
+            field=models.CharField(default="telegram", max_length=20, verbose_name="Канал доставки"),
+        ),
+        migrations.AlterField(
+            model_name="deadrecipient",
+            name="recipient",
+            field=models.CharField(
+                help_text="Адрес получателя в канале доставки: chat_id, email или адрес вебхука",
+                max_length=255,
+                verbose_name="Получатель",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reminderdelivery",
+            name="recipient",
+            field=models.CharField(
+                help_text="Адрес получателя в канале доставки: chat_id, email или адрес вебхука",
+                max_length=255,
+                verbose_name="Получатель",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="deadrecipient",
+            constraint=models.UniqueConstraint(fields=("transport", "recipient"), name="unique_dead_recipient"),
+        ),
+    ]
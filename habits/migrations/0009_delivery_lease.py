@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_delivery_transport"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="reminderdelivery",
+            name="delivery_pending_idx",
+        ),
+        migrations.AlterField(
+            model_name="reminderdelivery",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="Для отправляемой доставки - окончание аренды, после которого её можно забрать снова",
+                verbose_name="Следующая попытка",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reminderdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает отправки"),
+                    ("sending", "Отправляется"),
+                    ("sent", "Отправлено"),
+                    ("failed", "Не доставлено"),
+                ],
+                default="pending",
+                max_length=10,
+                verbose_name="Статус",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminderdelivery",
+            index=models.Index(
+                condition=models.Q(("status__in", ("pending", "sending"))),
+                fields=["next_attempt_at"],
+                name="delivery_queue_idx",
+            ),
+        ),
+    ]
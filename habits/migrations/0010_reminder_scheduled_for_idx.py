@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_delivery_lease"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reminderoccurrence",
+            index=models.Index(fields=["scheduled_for"], name="reminder_scheduled_for_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0010_reminder_scheduled_for_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reminderdelivery",
+            index=models.Index(
+                condition=models.Q(("status__in", ("sent", "failed"))),
+                fields=["created_at"],
+                name="delivery_finished_idx",
+            ),
+        ),
+    ]
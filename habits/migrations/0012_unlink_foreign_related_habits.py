@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def unlink_foreign_related_habits(apps, schema_editor):
+    """Отвязываем связанные привычки других пользователей: раньше их можно было указать по id
+    и прочитать через ?expand=habit_related"""
+    Habit = apps.get_model("habits", "Habit")
+    Habit.objects.filter(owner__isnull=False, habit_related__isnull=False).exclude(
+        habit_related__owner=F("owner")
+    ).update(habit_related=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0011_delivery_finished_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(unlink_foreign_related_habits, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,16 @@
+from datetime import timedelta
+
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
+from habits.scheduling import get_next_fire_at, get_zone
 from habits.validators import validate_periodicity
+from users.models import User
+
+# Поля, от которых зависит расписание напоминаний
+SCHEDULE_FIELDS = ("execution_time", "periodicity", "owner_id")
 
 
 class Habit(models.Model):
@@ -15,6 +23,7 @@ class Habit(models.Model):
         help_text="Укажите владельца привычки",
         blank=True,
         null=True,
+        db_index=False,  # покрывается составным индексом (owner, id)
     )
     place = models.ForeignKey(
         "habits.Place",
@@ -78,14 +87,70 @@ class Habit(models.Model):
         default=False,
         help_text="Отметьте для публикации привычки в общий доступ",
     )
+    next_fire_at = models.DateTimeField(
+        verbose_name="Следующее напоминание",
+        help_text="Момент ближайшего напоминания о привычке, рассчитывается автоматически",
+        blank=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Привычка"
         verbose_name_plural = "Привычки"
+        indexes = [
+            # Список привычек пользователя с сортировкой по id (HabitViewSet)
+            models.Index(fields=["owner", "id"], name="habit_owner_id_idx"),
+            # Лента публичных привычек (PublicHabitViewSet)
+            models.Index(fields=["id"], condition=models.Q(is_published=True), name="habit_published_idx"),
+            # Окно напоминаний (remind_habit): только привычки с владельцем
+            models.Index(
+                fields=["next_fire_at"], condition=models.Q(owner__isnull=False), name="habit_owned_next_fire_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.action
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженные значения полей расписания, чтобы пересчитывать его только при изменениях"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_schedule = instance._get_schedule_key()
+        instance._loaded_is_published = instance.__dict__.get("is_published", False)
+        return instance
+
+    def _get_schedule_key(self):
+        # Читаем через __dict__, чтобы не подгружать отложенные (deferred) поля
+        return tuple(self.__dict__.get(field) for field in SCHEDULE_FIELDS)
+
+    def get_owner_timezone(self):
+        """Часовой пояс владельца; уже загруженный владелец (например, текущий пользователь) не запрашивается"""
+        owner = self._state.fields_cache.get("owner")
+        if owner is not None and owner.pk == self.owner_id:
+            return get_zone(owner.timezone)
+        return get_zone(User.objects.filter(pk=self.owner_id).values_list("timezone", flat=True).first())
+
+    def refresh_schedule(self, now=None):
+        """Пересчитывает момент ближайшего напоминания в часовом поясе владельца.
+        Опорной датой служит дата текущего напоминания, чтобы смена времени или периодичности
+        не сбивала цикл привычки. При сокращении периодичности цикл отсчитывается от последнего
+        напоминания (за прежний период до текущего), чтобы следующее напоминание приблизилось.
+        Привычки без владельца или без времени выполнения не напоминаются"""
+        if not self.owner_id:
+            self.next_fire_at = None
+            return
+
+        tz = self.get_owner_timezone()
+        anchor = None
+        if self.next_fire_at:
+            anchor = timezone.localtime(self.next_fire_at, tz).date()
+            loaded = getattr(self, "_loaded_schedule", None)
+            previous_periodicity = loaded[SCHEDULE_FIELDS.index("periodicity")] if loaded else None
+            if previous_periodicity and previous_periodicity > self.periodicity:
+                anchor -= timedelta(days=previous_periodicity - self.periodicity)
+        self.next_fire_at = get_next_fire_at(self.execution_time, now, self.periodicity, anchor, tz)
+
     def clean(self):
         """
         Валидация модели согласно бизнес-правилам:
@@ -93,13 +158,15 @@ class Habit(models.Model):
         - Полезная привычка может иметь только один тип вознаграждения
         - Связанная привычка должна быть приятной
         - Запрет самоссылок
+        Существование и признак приятности связанной привычки проверяются одним запросом,
+        а если связанная привычка уже загружена (например, сериализатором) - без запросов
         """
         # Правило 1: Для приятных привычек
         if self.is_pleasant:
             errors = {}
 
             # Проверка связанной привычки
-            if self.habit_related:
+            if self.habit_related_id:
                 errors["habit_related"] = "Приятная привычка не может иметь связанных привычек"
 
             # Проверка вознаграждения (учитываем пустую строку)
@@ -109,52 +176,78 @@ class Habit(models.Model):
             if errors:
                 raise ValidationError(errors)
 
-        # Правило 2: Для полезных привычек
-        else:
-            # Проверка конфликта вознаграждений
-            if self.habit_related and self.reward and self.reward.strip():
-                raise ValidationError(
-                    {
-                        "habit_related": "Укажите либо связанную привычку, либо вознаграждение",
-                        "reward": "Укажите либо связанную привычку, либо вознаграждение",
-                    }
-                )
-
-            # Проверка типа связанной привычки
-            if self.habit_related:
-                # Защита от рекурсивных запросов при сохранении новой привычки
-                try:
-                    if not self.habit_related.is_pleasant:
-                        raise ValidationError({"habit_related": "Связанная привычка должна быть приятной"})
-                except Habit.DoesNotExist:
-                    # Игнорируем если связанная привычка еще не сохранена
-                    pass
-
-        # Общие правила
-        # 1. Запрет самоссылок
-        if self.habit_related and self.habit_related_id == self.id:
-            raise ValidationError({"habit_related": "Привычка не может быть связана сама с собой"})
-
-        # 2. Проверка существования связанной привычки
-        if self.habit_related_id and not Habit.objects.filter(pk=self.habit_related_id).exists():
-            raise ValidationError({"habit_related": "Указанная связанная привычка не существует"})
+        # Правило 2: Для полезных привычек - проверка конфликта вознаграждений
+        elif self.habit_related_id and self.reward and self.reward.strip():
+            raise ValidationError(
+                {
+                    "habit_related": "Укажите либо связанную привычку, либо вознаграждение",
+                    "reward": "Укажите либо связанную привычку, либо вознаграждение",
+                }
+            )
+
+        if self.habit_related_id:
+            # 1. Запрет самоссылок
+            if self.habit_related_id == self.id:
+                raise ValidationError({"habit_related": "Привычка не может быть связана сама с собой"})
+
+            # 2. Проверка существования и типа связанной привычки
+            related_is_pleasant = self._get_related_is_pleasant()
+            if related_is_pleasant is None:
+                raise ValidationError({"habit_related": "Указанная связанная привычка не существует"})
+            if not related_is_pleasant:
+                raise ValidationError({"habit_related": "Связанная привычка должна быть приятной"})
 
         # Вызов родительской валидации
         super().clean()
 
-    def save(self, *args, **kwargs):
-        """Автоматическая очистка полей перед сохранением"""
+    def _get_related_is_pleasant(self):
+        """Признак приятности связанной привычки или None, если её не существует"""
+        related = self._state.fields_cache.get("habit_related")
+        if related is not None and related.pk == self.habit_related_id:
+            return related.is_pleasant
+        return Habit.objects.filter(pk=self.habit_related_id).values_list("is_pleasant", flat=True).first()
+
+    def get_validated_relations(self):
+        """Связи, которые не нужно проверять запросом в full_clean: связанная привычка проверяется в clean(),
+        а уже загруженные объекты (например, сериализатором) заведомо существуют"""
+        validated = ["habit_related"]
+        for name in ("owner", "place"):
+            related = self._state.fields_cache.get(name)
+            if related is not None and related.pk == getattr(self, f"{name}_id"):
+                validated.append(name)
+        return validated
+
+    def apply_reward_rules(self):
+        """Автоматическая очистка полей вознаграждения перед сохранением"""
         # Для приятных привычек очищаем недопустимые поля
         if self.is_pleasant:
             self.habit_related = None
             self.reward = None
 
         # Для полезных привычек очищаем вознаграждение если есть связанная привычка
-        elif self.habit_related:
+        elif self.habit_related_id:
             self.reward = None
 
-        self.full_clean()
+    def sync_schedule(self):
+        """Пересчитывает расписание, если изменились время, периодичность или владелец.
+        Возвращает True, если расписание пересчитано"""
+        if getattr(self, "_loaded_schedule", None) == self._get_schedule_key():
+            return False
+        self.refresh_schedule()
+        return True
+
+    def save(self, *args, validate=True, **kwargs):
+        """Автоматическая очистка полей, валидация и пересчёт расписания перед сохранением.
+        validate=False - для внутренних записей, уже прошедших валидацию"""
+        self.apply_reward_rules()
+        if validate:
+            self.full_clean(exclude=self.get_validated_relations())
+
+        if self.sync_schedule() and kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "next_fire_at"}
+
         super().save(*args, **kwargs)
+        self._loaded_schedule = self._get_schedule_key()
 
 
 class Place(models.Model):
@@ -176,3 +269,336 @@ class Place(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ReminderOccurrence(models.Model):
+    """Журнал напоминаний: не более одной отправки на привычку и момент выполнения"""
+
+    habit = models.ForeignKey(
+        "habits.Habit",
+        on_delete=models.CASCADE,
+        related_name="reminders",
+        verbose_name="Привычка",
+    )
+    scheduled_for = models.DateTimeField(
+        verbose_name="Момент выполнения",
+        help_text="Момент выполнения привычки, о котором отправлено напоминание",
+    )
+    claim = models.UUIDField(
+        verbose_name="Запуск задачи",
+        help_text="Идентификатор запуска задачи, захватившего отправку напоминания",
+        db_index=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Напоминание"
+        verbose_name_plural = "Напоминания"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "scheduled_for"], name="unique_habit_reminder"),
+        ]
+        indexes = [
+            # Очистка старых записей журнала (prune_reminders)
+            models.Index(fields=["scheduled_for"], name="reminder_scheduled_for_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} - {self.scheduled_for}"
+
+
+class HabitCompletion(models.Model):
+    """Отметка о выполнении привычки - не более одной в день"""
+
+    habit = models.ForeignKey(
+        "habits.Habit",
+        on_delete=models.CASCADE,
+        related_name="completions",
+        verbose_name="Привычка",
+    )
+    completed_on = models.DateField(
+        verbose_name="Дата выполнения",
+        help_text="День, в который привычка выполнена",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Выполнение привычки"
+        verbose_name_plural = "Выполнения привычек"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "completed_on"], name="unique_habit_completion"),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} - {self.completed_on}"
+
+
+class HabitStreak(models.Model):
+    """Сводка серий выполнения привычки. Обновляется при каждой отметке за O(1), без пересчёта истории"""
+
+    habit = models.OneToOneField(
+        "habits.Habit",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="streak",
+        verbose_name="Привычка",
+    )
+    current_streak = models.PositiveIntegerField(
+        verbose_name="Текущая серия",
+        default=0,
+        help_text="Количество выполнений подряд без пропуска периода",
+    )
+    longest_streak = models.PositiveIntegerField(
+        verbose_name="Лучшая серия",
+        default=0,
+    )
+    last_completed_on = models.DateField(
+        verbose_name="Последнее выполнение",
+        blank=True,
+        null=True,
+    )
+    total_completions = models.PositiveIntegerField(
+        verbose_name="Всего выполнений",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Серия выполнения привычки"
+        verbose_name_plural = "Серии выполнения привычек"
+
+    def __str__(self):
+        return f"{self.habit_id} - {self.current_streak}"
+
+
+class CompletionRollup(models.Model):
+    """Количество выполнений привычки за день или неделю. Поддерживается задачей rollup_completions"""
+
+    PERIOD_DAY = "day"
+    PERIOD_WEEK = "week"
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, "День"),
+        (PERIOD_WEEK, "Неделя"),
+    ]
+
+    owner = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="completion_rollups",
+        verbose_name="Владелец привычки",
+    )
+    habit = models.ForeignKey(
+        "habits.Habit",
+        on_delete=models.CASCADE,
+        related_name="completion_rollups",
+        verbose_name="Привычка",
+    )
+    period = models.CharField(
+        max_length=4,
+        choices=PERIOD_CHOICES,
+        verbose_name="Период",
+    )
+    period_start = models.DateField(
+        verbose_name="Начало периода",
+        help_text="День или понедельник недели",
+    )
+    completions = models.PositiveIntegerField(
+        verbose_name="Количество выполнений",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Выполнения привычки за период"
+        verbose_name_plural = "Выполнения привычек за период"
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "period", "period_start"], name="unique_habit_rollup"),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "period", "period_start"], name="rollup_owner_period_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.habit_id} - {self.period} {self.period_start}: {self.completions}"
+
+
+class OwnerCompletionRollup(models.Model):
+    """Количество выполнений всех привычек пользователя за день или неделю"""
+
+    owner = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        related_name="owner_completion_rollups",
+        verbose_name="Пользователь",
+    )
+    period = models.CharField(
+        max_length=4,
+        choices=CompletionRollup.PERIOD_CHOICES,
+        verbose_name="Период",
+    )
+    period_start = models.DateField(
+        verbose_name="Начало периода",
+        help_text="День или понедельник недели",
+    )
+    completions = models.PositiveIntegerField(
+        verbose_name="Количество выполнений",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Выполнения пользователя за период"
+        verbose_name_plural = "Выполнения пользователей за период"
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "period", "period_start"], name="unique_owner_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} - {self.period} {self.period_start}: {self.completions}"
+
+
+class RollupWatermark(models.Model):
+    """Отметка, до какого id события уже учтены в агрегатах"""
+
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Название",
+    )
+    last_id = models.BigIntegerField(
+        verbose_name="Последний учтённый id",
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = "Отметка агрегации"
+        verbose_name_plural = "Отметки агрегации"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+
+class ReminderDelivery(models.Model):
+    """Исходящее напоминание (outbox): создаётся в одной транзакции со сдвигом расписания
+    и доставляется отдельной задачей с повторами, поэтому сбой телеграма не теряет напоминания"""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_SENDING, "Отправляется"),
+        (STATUS_SENT, "Отправлено"),
+        (STATUS_FAILED, "Не доставлено"),
+    )
+
+    habit = models.ForeignKey(
+        "habits.Habit",
+        on_delete=models.SET_NULL,
+        related_name="deliveries",
+        verbose_name="Привычка",
+        null=True,
+        blank=True,
+    )
+    transport = models.CharField(
+        max_length=20,
+        default="telegram",
+        verbose_name="Канал доставки",
+    )
+    recipient = models.CharField(
+        max_length=255,
+        verbose_name="Получатель",
+        help_text="Адрес получателя в канале доставки: chat_id, email или адрес вебхука",
+    )
+    text = models.TextField(
+        verbose_name="Текст сообщения",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Попыток отправки",
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Следующая попытка",
+        help_text="Для отправляемой доставки - окончание аренды, после которого её можно забрать снова",
+    )
+    last_error = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Последняя ошибка",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+    sent_at = models.DateTimeField(
+        verbose_name="Дата отправки",
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = "Исходящее напоминание"
+        verbose_name_plural = "Исходящие напоминания"
+        indexes = [
+            # Очередь на отправку - ожидающие и отправляемые доставки, в порядке следующей попытки
+            # (у отправляемых это окончание аренды)
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status__in=("pending", "sending")),
+                name="delivery_queue_idx",
+            ),
+            # Очистка завершённых доставок (prune_reminders)
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status__in=("sent", "failed")),
+                name="delivery_finished_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.transport}:{self.recipient} - {self.get_status_display()}"
+
+
+class DeadRecipient(models.Model):
+    """Получатель, которому доставка невозможна (чат не найден, бот заблокирован, вебхук удалён).
+    Напоминания ему не отправляются, пока запись не удалена"""
+
+    transport = models.CharField(
+        max_length=20,
+        default="telegram",
+        verbose_name="Канал доставки",
+    )
+    recipient = models.CharField(
+        max_length=255,
+        verbose_name="Получатель",
+        help_text="Адрес получателя в канале доставки: chat_id, email или адрес вебхука",
+    )
+    reason = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Причина",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = "Недоступный получатель"
+        verbose_name_plural = "Недоступные получатели"
+        constraints = [
+            models.UniqueConstraint(fields=["transport", "recipient"], name="unique_dead_recipient"),
+        ]
+
+    def __str__(self):
+        return f"{self.transport}:{self.recipient}"
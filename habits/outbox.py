@@ -0,0 +1,146 @@
+"""
+Очередь исходящих напоминаний (transactional outbox).
+
+Задача напоминаний только записывает сообщения в ReminderDelivery в той же транзакции,
+в которой сдвигает расписание привычек. Задача deliver_reminders разбирает очередь пачками в три шага:
+1. В короткой транзакции забирает ожидающие доставки через SELECT ... FOR UPDATE SKIP LOCKED и помечает их
+   отправляемыми на время аренды REMINDER_DELIVERY_LEASE, поэтому несколько воркеров не мешают друг другу.
+2. Отправляет сообщения вне транзакции: блокировки и соединение с базой на время запросов не удерживаются.
+3. Во второй короткой транзакции записывает результаты.
+Если воркер упал после шага 1, доставки снова выбираются после окончания аренды. Каждый захват считается
+попыткой, поэтому сообщение, на котором падает воркер, не выбирается бесконечно.
+Временные ошибки повторяются с нарастающей задержкой (или через retry_after из ответа 429),
+получатели, отклонённые каналом доставки, попадают в DeadRecipient.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from config import settings
+from habits.models import DeadRecipient, ReminderDelivery
+from habits.services import DELIVERY_REJECTED, DELIVERY_SENT
+from habits.transports import get_transport
+
+# Поля доставки, которые меняются при отправке
+DELIVERY_UPDATE_FIELDS = ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+
+
+def get_retry_delay(attempts):
+    """Задержка перед следующей попыткой: удваивается с каждой попыткой, но не больше максимальной"""
+    delay = settings.REMINDER_DELIVERY_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.REMINDER_DELIVERY_MAX_BACKOFF))
+
+
+def claim_deliveries(batch_size, now):
+    """Забирает пачку доставок к отправке: ожидающие и отправляемые с истёкшей арендой.
+    Забранные доставки помечаются отправляемыми до окончания аренды"""
+    with transaction.atomic():
+        deliveries = list(
+            ReminderDelivery.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=(ReminderDelivery.STATUS_PENDING, ReminderDelivery.STATUS_SENDING),
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        claimed = []
+        for delivery in deliveries:
+            if delivery.status == ReminderDelivery.STATUS_SENDING and (
+                delivery.attempts >= settings.REMINDER_DELIVERY_MAX_ATTEMPTS
+            ):
+                # Воркер не записал результат ни одной попытки - скорее всего, падает на этом сообщении
+                delivery.status = ReminderDelivery.STATUS_FAILED
+                delivery.last_error = "Истекла аренда последней попытки"
+                continue
+            delivery.status = ReminderDelivery.STATUS_SENDING
+            delivery.attempts += 1
+            delivery.next_attempt_at = now + timedelta(seconds=settings.REMINDER_DELIVERY_LEASE)
+            claimed.append(delivery)
+        ReminderDelivery.objects.bulk_update(deliveries, ["status", "attempts", "next_attempt_at", "last_error"])
+    return claimed
+
+
+def drain_outbox(batch_size, now=None):
+    """Отправляет очередную пачку ожидающих доставок, возвращает счётчик результатов по статусам"""
+    now = now or timezone.now()
+    results = Counter()
+    deliveries = claim_deliveries(batch_size, now)
+    if not deliveries:
+        return results
+
+    dead = set(
+        DeadRecipient.objects.filter(recipient__in={delivery.recipient for delivery in deliveries}).values_list(
+            "transport", "recipient"
+        )
+    )
+    by_transport = defaultdict(list)
+    for delivery in deliveries:
+        if (delivery.transport, delivery.recipient) in dead:
+            delivery.status = ReminderDelivery.STATUS_FAILED
+            delivery.last_error = "Получатель в списке недоступных"
+            results["skipped"] += 1
+        elif delivery.transport not in settings.NOTIFICATION_TRANSPORTS:
+            delivery.status = ReminderDelivery.STATUS_FAILED
+            delivery.last_error = "Канал доставки не настроен"
+            results["skipped"] += 1
+        else:
+            by_transport[delivery.transport].append(delivery)
+
+    # Сообщения отправляются вне транзакции
+    sent = []
+    for transport, transport_deliveries in by_transport.items():
+        outcomes = get_transport(transport).deliver_many(
+            (delivery.recipient, delivery.text) for delivery in transport_deliveries
+        )
+        sent.extend(zip(transport_deliveries, outcomes))
+
+    rejected = {}
+    for delivery, (outcome, error) in sent:
+        results[outcome] += 1
+        if outcome == DELIVERY_SENT:
+            delivery.status = ReminderDelivery.STATUS_SENT
+            delivery.sent_at = now
+            continue
+        delivery.last_error = error
+        if outcome == DELIVERY_REJECTED:
+            delivery.status = ReminderDelivery.STATUS_FAILED
+            rejected[(delivery.transport, delivery.recipient)] = error
+        elif delivery.attempts >= settings.REMINDER_DELIVERY_MAX_ATTEMPTS:
+            delivery.status = ReminderDelivery.STATUS_FAILED
+        else:
+            delivery.status = ReminderDelivery.STATUS_PENDING
+            # Если канал сам сообщил, когда повторить (ответ 429 телеграма), повторяем тогда
+            retry_after = getattr(error, "retry_after", None)
+            delay = get_retry_delay(delivery.attempts) if retry_after is None else timedelta(seconds=retry_after)
+            delivery.next_attempt_at = now + delay
+
+    with transaction.atomic():
+        ReminderDelivery.objects.bulk_update(deliveries, DELIVERY_UPDATE_FIELDS)
+        DeadRecipient.objects.bulk_create(
+            (
+                DeadRecipient(transport=transport, recipient=recipient, reason=reason)
+                for (transport, recipient), reason in rejected.items()
+            ),
+            ignore_conflicts=True,
+        )
+    return results
+
+
+def get_outbox_stats(now=None):
+    """Состояние очереди: сколько доставок ожидает, из них уже к отправке, сколько не доставлено,
+    возраст самой старой ожидающей доставки и количество недоступных получателей"""
+    now = now or timezone.now()
+    pending = ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_PENDING)
+    oldest = pending.aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "pending": pending.count(),
+        "sending": ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_SENDING).count(),
+        "due": pending.filter(next_attempt_at__lte=now).count(),
+        "failed": ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_FAILED).count(),
+        "dead_recipients": DeadRecipient.objects.count(),
+        "oldest_pending_age": (now - oldest).total_seconds() if oldest else None,
+    }
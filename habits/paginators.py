@@ -1,7 +1,40 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CustomCursorPagination(CursorPagination):
+    """Курсорная (keyset) пагинация по id: без COUNT(*) и OFFSET, глубокие страницы не дороже первой"""
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 10
+    ordering = "id"
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с курсорным режимом по запросу клиента:
+    ?pagination=cursor для первой страницы, дальше - по ссылкам next/previous с параметром cursor"""
+
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+    mode_query_param = "pagination"
+    cursor_pagination_class = CustomCursorPagination
+
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor" or cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
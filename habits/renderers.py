@@ -0,0 +1,55 @@
+"""
+Быстрый JSON-рендерер для списков привычек.
+
+FastJSONRenderer выдаёт те же байты, что и JSONRenderer DRF (компактный вывод, UTF-8 без экранирования,
+экранированные \\u2028 и \\u2029), но кодирует через orjson. Даты и время, а также
+неизвестные orjson типы кодируются JSONEncoder DRF. Числа с плавающей точкой orjson может записать иначе,
+чем json (например, 1e16 вместо 1e+16), поэтому рендерер подключён только к вьюхам привычек, где их нет.
+С отступами и при нестандартных настройках UNICODE_JSON/COMPACT_JSON работает JSONRenderer.
+
+NDJSONRenderer и CSVRenderer объявляют форматы выгрузки привычек для согласования по Accept:
+сама выгрузка отдаётся потоком мимо рендерера, через них проходят только ошибки - в формате JSON.
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, кодирующий через orjson с тем же результатом"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # Например, нестроковые ключи или целые больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+class ExportRenderer(FastJSONRenderer):
+    """Рендерер формата выгрузки: ошибки выгрузки отдаются в JSON"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = FastJSONRenderer.media_type
+        return super().render(data, renderer_context=renderer_context)
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
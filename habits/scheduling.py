@@ -0,0 +1,130 @@
+"""
+Расписание напоминаний о привычках.
+
+Ближайшее выполнение каждой привычки хранится в Habit.next_fire_at - абсолютном моменте (UTC),
+заранее вычисленном из местного времени execution_time в часовом поясе владельца (User.timezone).
+Следующие выполнения наступают каждые periodicity дней в то же местное время; каждый шаг
+пересчитывается по местным датам, поэтому переход на летнее время учитывается автоматически.
+Дата next_fire_at служит опорной датой (anchor) расписания: от неё отсчитываются все последующие выполнения.
+Модуль - единственный источник правды о том, какие привычки должны выполняться в заданный
+промежуток времени: и для задачи напоминаний, и для API предстоящих напоминаний.
+"""
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.db.models import Q
+from django.utils import timezone
+
+# Напоминание отправляется заранее, за несколько минут до времени выполнения
+REMINDER_LEAD = timedelta(minutes=5)
+
+# Максимальная периодичность привычки в днях (см. habits.validators.validate_periodicity)
+MAX_PERIODICITY = 7
+
+# Наибольший сдвиг местных часов при переходе на летнее время (с запасом)
+DST_MARGIN = timedelta(hours=2)
+
+
+def get_zone(name):
+    """Часовой пояс по названию; без названия - часовой пояс сервера"""
+    return ZoneInfo(name) if name else timezone.get_default_timezone()
+
+
+def get_local_today(name):
+    """Сегодняшняя дата в часовом поясе по названию (у пользователя - User.timezone)"""
+    return timezone.localdate(timezone=get_zone(name))
+
+
+def get_next_fire_at(execution_time, after=None, periodicity=1, anchor=None, tz=None):
+    """Ближайший момент выполнения привычки, не раньше after (по умолчанию - сейчас).
+    Если задана опорная дата anchor, выполнения идут с шагом periodicity дней от неё.
+    Время выполнения и опорная дата - местные для часового пояса tz (по умолчанию - сервера)"""
+    if execution_time is None:
+        return None
+
+    after = timezone.localtime(after, tz)
+    fire_at = timezone.make_aware(datetime.combine(anchor or after.date(), execution_time), tz)
+    if fire_at >= after:
+        return fire_at
+    return advance_fire_at(fire_at, execution_time, periodicity if anchor else 1, after - timedelta.resolution, tz)
+
+
+def advance_fire_at(fire_at, execution_time, periodicity, after, tz=None):
+    """Следующий момент выполнения после fire_at с шагом periodicity дней, строго позже after.
+    Шаг считается по местным датам часового пояса tz, поэтому время выполнения
+    не сдвигается при переходе на летнее время"""
+    after = max(after, fire_at)
+    day = timezone.localtime(fire_at, tz).date()
+    if after > fire_at:
+        # Пропускаем целые периоды сразу, без перебора по одному
+        day += timedelta(days=(after - fire_at).days // periodicity * periodicity)
+    while True:
+        next_fire_at = timezone.make_aware(datetime.combine(day, execution_time), tz)
+        if next_fire_at > after:
+            return next_fire_at
+        day += timedelta(days=periodicity)
+
+
+def due_q(start, end, now=None):
+    """Условие на привычки, у которых есть выполнение в полуинтервале [start, end).
+
+    Выполнения привычки - это next_fire_at + k * periodicity суток, а next_fire_at не бывает
+    раньше now - REMINDER_LEAD (за этим следит задача напоминаний). Поэтому условие сводится
+    к объединению диапазонов по next_fire_at, которые целиком вычисляются в базе по индексу.
+    Для окна короче REMINDER_LEAD от текущего момента это один точный диапазон.
+    Местные сутки владельца могут отличаться от 24 часов на переход на летнее время, поэтому
+    сдвинутые диапазоны расширяются на DST_MARGIN; точные моменты выполнения даёт iter_occurrences.
+    """
+    now = now or timezone.now()
+    earliest = min(start, now - REMINDER_LEAD)
+
+    condition = Q(next_fire_at__gte=start, next_fire_at__lt=end)
+    for periodicity in range(1, MAX_PERIODICITY + 1):
+        # Выполнения с k >= 1: окно, сдвинутое назад на k периодов
+        shift = timedelta(days=periodicity)
+        while end - shift + DST_MARGIN > earliest:
+            condition |= Q(
+                periodicity=periodicity,
+                next_fire_at__gte=max(start - shift - DST_MARGIN, earliest),
+                next_fire_at__lt=end - shift + DST_MARGIN,
+            )
+            shift += timedelta(days=periodicity)
+    return condition
+
+
+def due_habits(start, end, queryset=None, now=None):
+    """Привычки с владельцем, у которых есть выполнение в [start, end)"""
+    if queryset is None:
+        from habits.models import Habit
+
+        queryset = Habit.objects.all()
+    return queryset.filter(due_q(start, end, now), owner__isnull=False)
+
+
+def iter_occurrences(habit, start, end, tz=None):
+    """Моменты выполнения привычки в [start, end) по её расписанию в часовом поясе владельца tz"""
+    fire_at = habit.next_fire_at
+    if fire_at is None:
+        return
+    if fire_at < start:
+        fire_at = advance_fire_at(fire_at, habit.execution_time, habit.periodicity, start - timedelta.resolution, tz)
+    while fire_at < end:
+        yield fire_at
+        fire_at = advance_fire_at(fire_at, habit.execution_time, habit.periodicity, fire_at, tz)
+
+
+def reschedule_owner_habits(owner_id, old_tz, new_tz, now=None):
+    """Пересчитывает next_fire_at привычек владельца после смены его часового пояса.
+    Местное время выполнения и опорная дата сохраняются, меняется только абсолютный момент"""
+    from habits.models import Habit
+
+    habits = list(
+        Habit.objects.filter(owner_id=owner_id, next_fire_at__isnull=False).only(
+            "id", "next_fire_at", "execution_time", "periodicity"
+        )
+    )
+    for habit in habits:
+        anchor = timezone.localtime(habit.next_fire_at, old_tz).date()
+        habit.next_fire_at = get_next_fire_at(habit.execution_time, now, habit.periodicity, anchor, new_tz)
+    Habit.objects.bulk_update(habits, ["next_fire_at"])
@@ -1,11 +1,147 @@
-from rest_framework import serializers
+from datetime import time, timedelta
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
 from rest_framework.serializers import ModelSerializer
+from rest_framework.settings import api_settings
 
-from habits.models import Habit, Place
+from habits.models import CompletionRollup, Habit, HabitCompletion, HabitStreak, Place
+from habits.stats import PERIOD_DAYS
+from habits.streaks import get_current_streak
 from habits.validators import validate_periodicity
 
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Связь по первичному ключу. При пакетной обработке связанные объекты загружаются заранее
+    (см. load_related_objects) и берутся из context["related_objects"] без запроса на каждый элемент"""
+
+    def to_internal_value(self, data):
+        related_objects = self.context.get("related_objects", {}).get(self.field_name)
+        if related_objects is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in related_objects:
+            self.fail("does_not_exist", pk_value=data)
+        return related_objects[pk]
+
+
+def load_related_objects(serializer, items):
+    """Загружает связанные объекты для всех элементов пакета - по одному запросу на поле"""
+    related_objects = {}
+    for name, field in serializer.fields.items():
+        if not isinstance(field, PrefetchedPrimaryKeyRelatedField) or field.read_only:
+            continue
+
+        model_pk = field.get_queryset().model._meta.pk
+        ids = set()
+        for item in items:
+            if isinstance(item, dict) and item.get(name) is not None and not isinstance(item[name], bool):
+                try:
+                    ids.add(model_pk.to_python(item[name]))
+                except DjangoValidationError:
+                    # Ошибку типа вернёт само поле при валидации элемента
+                    pass
+        related_objects[name] = field.get_queryset().in_bulk(ids)
+    return related_objects
+
+
+# Представление значений values() так же, как его строят поля сериализатора (to_representation)
+ROW_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.BigIntegerField: int,
+    serializers.CharField: str,
+    serializers.BooleanField: bool,
+}
+
+
+def compile_row_serializer(serializer, prefix=""):
+    """Строит по сериализатору функцию, которая переводит строку QuerySet.values() в словарь,
+    совпадающий с serializer.data. Возвращает пару (столбцы для values(), функция) или None,
+    если у сериализатора есть поля, которые так не отобразить"""
+    columns, getters = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if not field.source or "." in field.source or field.source == "*":
+            return None
+        column = f"{prefix}{field.source}"
+        if isinstance(field, ModelSerializer):
+            compiled = compile_row_serializer(field, prefix=f"{column}__")
+            if compiled is None:
+                return None
+            nested_columns, nested_to_dict = compiled
+            columns += [column, *nested_columns]
+            getters.append((name, column, nested_to_dict, True))
+            continue
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            # values() отдаёт id связанного объекта
+            convert = None
+        elif isinstance(field, serializers.TimeField):
+            output_format = getattr(field, "format", api_settings.TIME_FORMAT)
+            if output_format not in (None, ISO_8601):
+                return None
+            # Без формата объект времени кодирует рендерер
+            convert = time.isoformat if output_format == ISO_8601 else None
+        elif type(field) in ROW_CONVERTERS:
+            convert = ROW_CONVERTERS[type(field)]
+        elif isinstance(field, (serializers.DateField, serializers.DateTimeField)):
+            # Формат даты и перевод в текущий часовой пояс - как у поля сериализатора
+            convert = field.to_representation
+        else:
+            return None
+        columns.append(column)
+        getters.append((name, column, convert, False))
+
+    def to_dict(row):
+        data = {}
+        for name, column, convert, whole_row in getters:
+            value = row[column]
+            if value is None or convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(row if whole_row else value)
+        return data
+
+    return columns, to_dict
+
+
+def get_today(context):
+    """Сегодняшняя дата пользователя из context["today"]; без неё - дата в часовом поясе сервера"""
+    return context.get("today") or timezone.localdate()
+
+
+class PlaceSerializer(ModelSerializer):
+
+    class Meta:
+        model = Place
+        fields = "__all__"
+
+
+class HabitSummarySerializer(ModelSerializer):
+    """Краткое представление связанной привычки"""
+
+    class Meta:
+        model = Habit
+        fields = ("id", "action", "time_required")
+
+
 class HabitSerializer(ModelSerializer):
+    """Сериализатор привычки. При чтении в context можно передать expand - связи, которые отдаются
+    вложенными объектами вместо id, и fields - поля, которые остаются в ответе"""
+
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+    # Связи, которые разворачиваются по ?expand=, и сериализаторы их представления
+    expandable_fields = {"place": PlaceSerializer, "habit_related": HabitSummarySerializer}
+
     periodicity = serializers.IntegerField(
         min_value=1,
         max_value=7,
@@ -15,7 +151,46 @@ class HabitSerializer(ModelSerializer):
 
     class Meta:
         model = Habit
-        fields = "__all__"
+        # Расписание напоминаний - служебное поле, оно доступно через my-habits/upcoming/
+        exclude = ("next_fire_at",)
+        # Владелец всегда текущий пользователь
+        read_only_fields = ("owner",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get("fields")
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in self.context.get("expand", ()):
+            if name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+        request = self.context.get("request")
+        related = self.fields.get("habit_related")
+        if request is not None and isinstance(related, PrefetchedPrimaryKeyRelatedField):
+            # Связать можно только свою привычку: иначе её действие читается через ?expand=habit_related
+            if request.user.is_authenticated:
+                related.queryset = Habit.objects.filter(owner=request.user)
+            else:
+                related.queryset = Habit.objects.none()
+
+    @classmethod
+    def get_read_columns(cls, fields=None, expand=()):
+        """Поля модели для QuerySet.only(): только отдаваемые поля и поля развёрнутых связей.
+        None - нужны все поля"""
+        if fields is None:
+            return None
+        columns = {"id"}
+        for name in fields:
+            columns.add(name)
+            if name in expand:
+                related_fields = cls.expandable_fields[name].Meta.fields
+                if related_fields == "__all__":
+                    related_fields = [
+                        field.name for field in Habit._meta.get_field(name).related_model._meta.concrete_fields
+                    ]
+                columns.update(f"{name}__{field}" for field in related_fields)
+        return sorted(columns)
 
     def validate(self, data):
         """Кастомная валидация"""
@@ -27,8 +202,142 @@ class HabitSerializer(ModelSerializer):
         return data
 
 
-class PlaceSerializer(ModelSerializer):
+class UpcomingReminderSerializer(serializers.Serializer):
+    """Сериализатор предстоящего напоминания о привычке"""
+
+    habit = serializers.IntegerField(help_text="Идентификатор привычки")
+    action = serializers.CharField(help_text="Действие привычки")
+    scheduled_for = serializers.DateTimeField(help_text="Момент выполнения привычки")
+
+
+class HabitCompletionSerializer(ModelSerializer):
+    """Сериализатор отметки о выполнении привычки"""
+
+    completed_on = serializers.DateField(
+        required=False, help_text="Дата выполнения, по умолчанию - сегодня в часовом поясе пользователя"
+    )
 
     class Meta:
-        model = Place
-        fields = "__all__"
+        model = HabitCompletion
+        fields = ("completed_on",)
+
+    def validate_completed_on(self, value):
+        if value > get_today(self.context):
+            raise serializers.ValidationError("Нельзя отметить выполнение в будущем")
+        return value
+
+
+class HabitCompletionExportSerializer(ModelSerializer):
+    """Сериализатор отметки о выполнении для выгрузки истории"""
+
+    class Meta:
+        model = HabitCompletion
+        fields = ("id", "habit", "completed_on", "created_at")
+
+
+class HabitStreakSerializer(ModelSerializer):
+    """Сериализатор сводки серий выполнения привычки"""
+
+    current_streak = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HabitStreak
+        fields = ("current_streak", "longest_streak", "last_completed_on", "total_completions")
+
+    def get_current_streak(self, obj):
+        return get_current_streak(obj, obj.habit.periodicity, get_today(self.context))
+
+
+class HabitStatsQuerySerializer(serializers.Serializer):
+    """Параметры запроса статистики: период агрегации и интервал дат [start, end]"""
+
+    # Максимальная длина запрашиваемого интервала в днях
+    max_range_days = 366
+    # Количество периодов по умолчанию, если начало интервала не указано
+    default_periods = {CompletionRollup.PERIOD_DAY: 30, CompletionRollup.PERIOD_WEEK: 12}
+
+    period = serializers.ChoiceField(choices=CompletionRollup.PERIOD_CHOICES, default=CompletionRollup.PERIOD_DAY)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        end = data.setdefault("end", get_today(self.context))
+        if "start" not in data:
+            days = self.default_periods[data["period"]] * PERIOD_DAYS[data["period"]]
+            data["start"] = end - timedelta(days=days - 1)
+        if data["start"] > end:
+            raise serializers.ValidationError({"start": "Начало интервала должно быть не позже конца"})
+        if (end - data["start"]).days >= self.max_range_days:
+            raise serializers.ValidationError({"start": f"Интервал не может быть длиннее {self.max_range_days} дней"})
+        return data
+
+
+@lru_cache(maxsize=128)
+def get_habit_row_serializer(fields=None, expand=()):
+    """Скомпилированное представление привычек для values() при заданных fields и expand (см. HabitSerializer)"""
+    return compile_row_serializer(HabitSerializer(context={"fields": fields, "expand": expand}))
+
+
+class HabitRepresentationQuerySerializer(serializers.Serializer):
+    """Параметры представления привычек при чтении: ?expand=place,habit_related - связанные объекты
+    вместо id, ?fields=id,action,execution_time - только перечисленные поля"""
+
+    expand = serializers.CharField(required=False)
+    fields = serializers.CharField(required=False)
+
+    @staticmethod
+    def split(value, allowed):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f"Неизвестные поля: {', '.join(unknown)}")
+        return names
+
+    def validate_expand(self, value):
+        # Вьюха может разрешить только часть связей (context["expandable_fields"])
+        return self.split(value, self.context.get("expandable_fields", HabitSerializer.expandable_fields))
+
+    def validate_fields(self, value):
+        return self.split(value, HabitSerializer().fields)
+
+    def validate(self, data):
+        data.setdefault("expand", [])
+        data.setdefault("fields", None)
+        return data
+
+
+class HabitExportQuerySerializer(serializers.Serializer):
+    """Параметры выгрузки: набор данных и формат. Формат передаётся в export_format,
+    потому что ?format= DRF использует для выбора рендерера"""
+
+    dataset = serializers.ChoiceField(choices=("habits", "completions"), default="habits")
+    export_format = serializers.ChoiceField(choices=("ndjson", "csv"), default="ndjson")
+
+
+class StatsBucketSerializer(serializers.Serializer):
+    """Сериализатор выполнений за один период"""
+
+    period_start = serializers.DateField()
+    completions = serializers.IntegerField()
+    adherence = serializers.FloatField(allow_null=True, help_text="Процент соблюдения расписания")
+
+
+class HabitStatsItemSerializer(serializers.Serializer):
+    """Сериализатор выполнений одной привычки за интервал"""
+
+    habit = serializers.IntegerField()
+    action = serializers.CharField()
+    completions = serializers.IntegerField()
+    adherence = serializers.FloatField(allow_null=True, help_text="Процент соблюдения расписания")
+
+
+class HabitStatsSerializer(serializers.Serializer):
+    """Сериализатор статистики выполнения привычек пользователя"""
+
+    period = serializers.CharField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    completions = serializers.IntegerField()
+    adherence = serializers.FloatField(allow_null=True, help_text="Процент соблюдения расписания")
+    buckets = StatsBucketSerializer(many=True)
+    habits = HabitStatsItemSerializer(many=True)
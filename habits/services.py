@@ -1,16 +1,188 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 
 from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Результаты доставки сообщения
+DELIVERY_SENT = "sent"
+# Временная ошибка: сеть, 5xx, исчерпан лимит частоты - доставку стоит повторить позже
+DELIVERY_RETRY = "retry"
+# Получатель отклонён навсегда (чат не найден, бот заблокирован) - повтор не поможет
+DELIVERY_REJECTED = "rejected"
+
+# Коды ответа телеграма, означающие, что сообщение этому чату доставить нельзя
+REJECTED_STATUS_CODES = (400, 403)
+
+
+class DeliveryError(str):
+    """Текст ошибки доставки; retry_after - через сколько секунд канал просит повторить (ответ 429)"""
+
+    def __new__(cls, value, retry_after=None):
+        error = super().__new__(cls, value)
+        error.retry_after = retry_after
+        return error
+
+
+class TokenBucket:
+    """Потокобезопасный ограничитель частоты: не более rate событий в секунду со всплеском до capacity"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def _reserve(self):
+        """Забирает токен и возвращает, сколько секунд нужно подождать до его появления"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            self.sleep(delay)
+
+
+class TelegramSender:
+    """Отправка сообщений в телеграм через общий пул соединений.
+
+    Сообщения отправляются параллельно (не более max_workers одновременно), с ограничением
+    общей частоты и частоты для одного чата, с таймаутом на запрос и повторами с нарастающей
+    задержкой. Ответ 429 повторяется через указанный телеграмом retry_after.
+    Результат доставки (deliver) различает временные ошибки и отказ получателя"""
+
+    # Сколько чатов помнить для ограничения частоты по чату
+    max_tracked_chats = 10000
+
+    def __init__(
+        self,
+        url,
+        timeout=(3.05, 10),
+        max_workers=16,
+        rate_limit=30,
+        chat_rate_limit=1,
+        max_retries=3,
+        backoff=0.5,
+        sleep=time.sleep,
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.chat_rate_limit = chat_rate_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.rate_bucket = TokenBucket(rate_limit, sleep=sleep)
+        self.chat_buckets = OrderedDict()
+        self.chat_buckets_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="telegram")
+
+    def _get_chat_bucket(self, chat_id):
+        with self.chat_buckets_lock:
+            bucket = self.chat_buckets.pop(chat_id, None) or TokenBucket(self.chat_rate_limit, sleep=self.sleep)
+            self.chat_buckets[chat_id] = bucket
+            if len(self.chat_buckets) > self.max_tracked_chats:
+                self.chat_buckets.popitem(last=False)
+            return bucket
+
+    def send(self, chat_id, message):
+        """Отправляет одно сообщение, возвращает True при успехе"""
+        return self.deliver(chat_id, message)[0] == DELIVERY_SENT
+
+    def deliver(self, chat_id, message, max_retries=None):
+        """Отправляет одно сообщение, возвращает пару (результат доставки, текст ошибки).
+        max_retries заменяет количество повторов отправителя; без повторов ответ 429 не ожидается,
+        а возвращается с retry_after в DeliveryError"""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        chat_bucket = self._get_chat_bucket(chat_id)
+        error, retry_after = "", None
+        for attempt in range(max_retries + 1):
+            chat_bucket.acquire()
+            self.rate_bucket.acquire()
+            delay = self.backoff * 2**attempt
+            try:
+                response = self.session.post(
+                    self.url, json={"chat_id": chat_id, "text": message}, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                error = str(e)
+                logger.warning(f"Telegram API error: {e}")
+            else:
+                if response.ok:
+                    return DELIVERY_SENT, ""
+                error = f"{response.status_code}: {response.text}"
+                if response.status_code in REJECTED_STATUS_CODES:
+                    # Чат не найден или бот заблокирован - повтор не поможет
+                    logger.error(f"Telegram API error {error}")
+                    return DELIVERY_REJECTED, error
+                if response.status_code == 429:
+                    delay = retry_after = self._get_retry_after(response, delay)
+                elif response.status_code < 500:
+                    # Ошибка настройки (например, неверный токен) - повторим позже, не отклоняя получателя
+                    logger.error(f"Telegram API error {error}")
+                    return DELIVERY_RETRY, error
+                logger.warning(f"Telegram API error {response.status_code}, attempt {attempt + 1}")
+
+            if attempt < max_retries:
+                self.sleep(delay)
+                retry_after = None
+
+        logger.error(f"Telegram API: message to chat {chat_id} was not sent after {max_retries + 1} attempts")
+        return DELIVERY_RETRY, DeliveryError(error, retry_after)
+
+    @staticmethod
+    def _get_retry_after(response, default):
+        try:
+            return response.json()["parameters"]["retry_after"]
+        except (ValueError, KeyError, TypeError):
+            return default
+
+    def deliver_many(self, messages, max_retries=None):
+        """Параллельно отправляет сообщения (пары chat_id, текст), возвращает пары (результат, ошибка)"""
+        return list(self.executor.map(lambda item: self.deliver(*item, max_retries=max_retries), messages))
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_telegram_sender():
+    """Общий для процесса отправитель сообщений в телеграм"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender(
+                f"{settings.TELEGRAM_URL}{settings.TELEGRAM_TOKEN}/sendMessage",
+                timeout=settings.TELEGRAM_TIMEOUT,
+                max_workers=settings.TELEGRAM_MAX_WORKERS,
+                rate_limit=settings.TELEGRAM_RATE_LIMIT,
+                chat_rate_limit=settings.TELEGRAM_CHAT_RATE_LIMIT,
+                max_retries=settings.TELEGRAM_MAX_RETRIES,
+            )
+        return _sender
+
+
 def send_telegram_message(chat_id, message):
     """Функция отправки сообщения в телеграм"""
-
-    try:
-        url = f"{settings.TELEGRAM_URL}{settings.TELEGRAM_TOKEN}/sendMessage"
-        params = {"chat_id": chat_id, "text": message}
-        requests.get(url, params=params)
-    except requests.RequestException as e:
-        logger.error(f"Telegram API error: {e}")
+    return get_telegram_sender().send(chat_id, message)
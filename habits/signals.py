@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from habits.cache import bump_public_feed_version
+from habits.models import Habit, Place
+from habits.scheduling import get_zone, reschedule_owner_habits
+from users.models import User
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def reset_public_feed(sender, instance, **kwargs):
+    """Сбрасывает кеш ленты, если изменилась публичная привычка или привычка перестала быть публичной"""
+    if instance.is_published or getattr(instance, "_loaded_is_published", False):
+        bump_public_feed_version()
+    instance._loaded_is_published = instance.is_published
+
+
+@receiver(pre_delete, sender=Habit)
+def reset_public_feed_on_related_delete(sender, instance, **kwargs):
+    """Сбрасывает кеш ленты при удалении привычки, связанной с публичными: поле habit_related
+    обнуляется через SET_NULL запросом UPDATE, без сигнала post_save"""
+    if instance.rewarded_habits.filter(is_published=True).exists():
+        bump_public_feed_version()
+
+
+@receiver(pre_delete, sender=User)
+def reset_public_feed_on_owner_delete(sender, instance, **kwargs):
+    """Сбрасывает кеш ленты при удалении владельца публичных привычек: владелец обнуляется через SET_NULL
+    запросом UPDATE, без сигнала post_save"""
+    if instance.habit_set.filter(is_published=True).exists():
+        bump_public_feed_version()
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def reset_public_feed_on_place_change(sender, instance, **kwargs):
+    """Сбрасывает кеш ленты при изменении места - оно может быть развёрнуто в ленте (?expand=place)"""
+    bump_public_feed_version()
+
+
+@receiver(post_save, sender=User)
+def reschedule_on_timezone_change(sender, instance, created, update_fields=None, **kwargs):
+    """Пересчитывает расписание привычек пользователя, если изменился его часовой пояс"""
+    if update_fields is not None and "timezone" not in update_fields:
+        return
+    loaded_timezone = getattr(instance, "_loaded_timezone", None)
+    if not created and loaded_timezone is not None and loaded_timezone != instance.timezone:
+        reschedule_owner_habits(instance.pk, get_zone(loaded_timezone), get_zone(instance.timezone))
+    instance._loaded_timezone = instance.timezone
@@ -0,0 +1,169 @@
+"""
+Статистика выполнения привычек по дням и неделям.
+
+Дашборды читают только заранее агрегированные таблицы CompletionRollup и OwnerCompletionRollup,
+поэтому стоимость чтения зависит от длины запрошенного интервала, а не от длины истории.
+Агрегаты обновляются инкрементально: задача rollup_completions учитывает только отметки,
+появившиеся после отметки RollupWatermark.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from habits.models import CompletionRollup, Habit, HabitCompletion, OwnerCompletionRollup, RollupWatermark
+
+COMPLETIONS_WATERMARK = "completions"
+
+# Отметки моложе этого возраста ещё не агрегируются: транзакция с меньшим id могла не успеть завершиться
+ROLLUP_SAFETY_LAG = timedelta(seconds=10)
+
+PERIOD_DAYS = {
+    CompletionRollup.PERIOD_DAY: 1,
+    CompletionRollup.PERIOD_WEEK: 7,
+}
+
+
+def get_period_start(day, period):
+    """Начало периода, в который попадает день: сам день или понедельник недели"""
+    if period == CompletionRollup.PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def rollup_new_completions(batch_size):
+    """Учитывает в агрегатах очередную порцию новых отметок, возвращает количество обработанных отметок"""
+    with transaction.atomic():
+        # Блокировка отметки не даёт двум запускам учесть одни и те же события дважды
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=COMPLETIONS_WATERMARK)
+        rows = list(
+            HabitCompletion.objects.filter(id__gt=watermark.last_id, created_at__lt=timezone.now() - ROLLUP_SAFETY_LAG)
+            .order_by("id")
+            .values_list("id", "habit_id", "habit__owner_id", "completed_on")[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        habit_counts = Counter()
+        owner_counts = Counter()
+        for _, habit_id, owner_id, completed_on in rows:
+            if owner_id is None:
+                continue
+            for period in PERIOD_DAYS:
+                period_start = get_period_start(completed_on, period)
+                habit_counts[(habit_id, owner_id, period, period_start)] += 1
+                owner_counts[(owner_id, period, period_start)] += 1
+
+        _increment_rollups(CompletionRollup, ("habit_id", "owner_id", "period", "period_start"), habit_counts)
+        _increment_rollups(OwnerCompletionRollup, ("owner_id", "period", "period_start"), owner_counts)
+
+        watermark.last_id = rows[-1][0]
+        watermark.save(update_fields=["last_id"])
+        return len(rows)
+
+
+def _increment_rollups(model, key_fields, counts):
+    """Прибавляет счётчики к агрегатам: существующие строки читаются одним запросом и обновляются
+    пакетно, недостающие создаются пакетно. Вызывается под блокировкой отметки агрегации"""
+    if not counts:
+        return
+
+    existing = model.objects.filter(
+        **{f"{key_fields[0]}__in": {key[0] for key in counts}},
+        period_start__gte=min(key[-1] for key in counts),
+        period_start__lte=max(key[-1] for key in counts),
+    )
+    to_update = []
+    for rollup in existing:
+        key = tuple(getattr(rollup, field) for field in key_fields)
+        if key in counts:
+            rollup.completions += counts.pop(key)
+            to_update.append(rollup)
+
+    model.objects.bulk_update(to_update, ["completions"])
+    model.objects.bulk_create(
+        model(**dict(zip(key_fields, key)), completions=completions) for key, completions in counts.items()
+    )
+
+
+def rebuild_rollups(batch_size):
+    """Пересчитывает агрегаты по всей истории отметок, возвращает количество обработанных отметок"""
+    with transaction.atomic():
+        RollupWatermark.objects.select_for_update().filter(name=COMPLETIONS_WATERMARK).update(last_id=0)
+        CompletionRollup.objects.all().delete()
+        OwnerCompletionRollup.objects.all().delete()
+
+    total = 0
+    while processed := rollup_new_completions(batch_size):
+        total += processed
+    return total
+
+
+def get_owner_stats(owner, period, start, end):
+    """Выполнения и процент соблюдения по периодам [start, end] и по привычкам пользователя.
+    Ожидаемое количество выполнений за период - сумма period_days / periodicity по привычкам"""
+    first_period, last_period = get_period_start(start, period), get_period_start(end, period)
+    period_days = PERIOD_DAYS[period]
+
+    habits = list(Habit.objects.filter(owner=owner).order_by("id").values_list("id", "action", "periodicity"))
+    expected_per_period = sum(period_days / periodicity for _, _, periodicity in habits)
+
+    completions_by_period = dict(
+        OwnerCompletionRollup.objects.filter(
+            owner=owner, period=period, period_start__gte=first_period, period_start__lte=last_period
+        ).values_list("period_start", "completions")
+    )
+    completions_by_habit = dict(
+        CompletionRollup.objects.filter(
+            owner=owner, period=period, period_start__gte=first_period, period_start__lte=last_period
+        )
+        .values("habit_id")
+        .annotate(total=Sum("completions"))
+        .values_list("habit_id", "total")
+    )
+
+    buckets = []
+    period_start = first_period
+    while period_start <= last_period:
+        completions = completions_by_period.get(period_start, 0)
+        buckets.append(
+            {
+                "period_start": period_start,
+                "completions": completions,
+                "adherence": _get_adherence(completions, expected_per_period),
+            }
+        )
+        period_start += timedelta(days=period_days)
+
+    periods_count = len(buckets)
+    return {
+        "period": period,
+        "start": first_period,
+        "end": last_period,
+        "completions": sum(bucket["completions"] for bucket in buckets),
+        "adherence": _get_adherence(
+            sum(bucket["completions"] for bucket in buckets), expected_per_period * periods_count
+        ),
+        "buckets": buckets,
+        "habits": [
+            {
+                "habit": habit_id,
+                "action": action,
+                "completions": completions_by_habit.get(habit_id, 0),
+                "adherence": _get_adherence(
+                    completions_by_habit.get(habit_id, 0), period_days / periodicity * periods_count
+                ),
+            }
+            for habit_id, action, periodicity in habits
+        ],
+    }
+
+
+def _get_adherence(completions, expected):
+    """Процент соблюдения расписания, не больше 100"""
+    if not expected:
+        return None
+    return round(min(completions / expected, 1) * 100, 1)
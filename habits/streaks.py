@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.db import transaction
+
+from habits.models import HabitCompletion, HabitStreak
+
+
+def apply_completion(streak, completed_on, periodicity):
+    """Учитывает новое выполнение в сводке серий.
+    Серия продолжается, если с прошлого выполнения прошло не больше periodicity дней:
+    для привычки раз в 3 дня два пропущенных дня серию не прерывают.
+    Отметка задним числом (раньше последнего выполнения) увеличивает только общее количество"""
+    streak.total_completions += 1
+    last_completed_on = streak.last_completed_on
+    if last_completed_on is not None and completed_on <= last_completed_on:
+        return
+
+    if last_completed_on is not None and completed_on - last_completed_on <= timedelta(days=periodicity):
+        streak.current_streak += 1
+    else:
+        streak.current_streak = 1
+    streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+    streak.last_completed_on = completed_on
+
+
+def register_completion(habit, completed_on):
+    """Отмечает выполнение привычки и обновляет сводку серий.
+    Возвращает сводку и признак того, что отметка новая (повторная отметка за день ничего не меняет)"""
+    with transaction.atomic():
+        # Блокировка сводки упорядочивает параллельные отметки одной привычки
+        streak, _ = HabitStreak.objects.select_for_update().get_or_create(habit=habit)
+        _, created = HabitCompletion.objects.get_or_create(habit=habit, completed_on=completed_on)
+        if created:
+            apply_completion(streak, completed_on, habit.periodicity)
+            streak.save()
+    return streak, created
+
+
+def get_current_streak(streak, periodicity, today):
+    """Текущая серия на дату today: если период после последнего выполнения прошёл, серия прервана"""
+    if streak.last_completed_on is None or today - streak.last_completed_on > timedelta(days=periodicity):
+        return 0
+    return streak.current_streak
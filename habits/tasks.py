@@ -1,35 +1,230 @@
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
 
-from celery import shared_task
+from celery import group, shared_task
 
-from habits.models import Habit
-from habits.services import send_telegram_message
+from config import settings
+from habits.models import Habit, ReminderDelivery, ReminderOccurrence
+from habits.outbox import drain_outbox
+from habits.scheduling import REMINDER_LEAD, advance_fire_at, due_habits, get_zone
+from habits.transports import get_recipient_fields, get_transport_class, reachable_owner_q
+from habits.stats import rollup_new_completions
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Сколько строк читать с сервера базы за раз при потоковом чтении
+ITERATOR_CHUNK_SIZE = 2000
+
+# Поля, нужные для сдвига расписания привычки в часовом поясе владельца
+SCHEDULE_COLUMNS = ("id", "next_fire_at", "execution_time", "periodicity", "owner__timezone")
+
+
+def claim_reminders(occurrences):
+    """Атомарно захватывает напоминания (пары идентификатор привычки, момент) для текущего запуска задачи.
+    Повторная вставка того же (привычка, момент) игнорируется уникальным ключом,
+    поэтому параллельные запуски получают непересекающиеся множества привычек"""
+    claim = uuid.uuid4()
+    ReminderOccurrence.objects.bulk_create(
+        [
+            ReminderOccurrence(habit_id=habit_id, scheduled_for=scheduled_for, claim=claim)
+            for habit_id, scheduled_for in occurrences
+        ],
+        ignore_conflicts=True,
+    )
+    return set(ReminderOccurrence.objects.filter(claim=claim).values_list("habit_id", flat=True))
+
+
+def delete_in_batches(queryset, batch_size):
+    """Удаляет строки queryset пачками по batch_size, каждая пачка - отдельный короткий запрос.
+    Возвращает количество удалённых строк"""
+    model = queryset.model
+    deleted = 0
+    while ids := list(queryset.values_list("pk", flat=True)[:batch_size]):
+        deleted += model.objects.filter(pk__in=ids).delete()[0]
+    return deleted
+
+
+def prune_reminder_occurrences(now):
+    """Удаляет старые записи журнала напоминаний: повторная отправка возможна только для моментов
+    около текущего окна (roll_forward_overdue не оставляет next_fire_at раньше now - REMINDER_LEAD)"""
+    cutoff = now - timedelta(days=settings.REMINDER_OCCURRENCE_RETENTION_DAYS)
+    return delete_in_batches(ReminderOccurrence.objects.filter(scheduled_for__lt=cutoff), settings.PRUNE_BATCH_SIZE)
+
+
+def prune_deliveries(now):
+    """Удаляет отправленные и недоставленные исходящие напоминания старше REMINDER_DELIVERY_RETENTION_DAYS.
+    Ожидающие и отправляемые доставки не удаляются"""
+    cutoff = now - timedelta(days=settings.REMINDER_DELIVERY_RETENTION_DAYS)
+    finished = ReminderDelivery.objects.filter(
+        status__in=(ReminderDelivery.STATUS_SENT, ReminderDelivery.STATUS_FAILED), created_at__lt=cutoff
+    )
+    return delete_in_batches(finished, settings.PRUNE_BATCH_SIZE)
+
+
+def roll_forward_overdue(now):
+    """Сдвигает пропущенные напоминания без отправки: после простоя воркера или у владельцев
+    без телеграма. После неё next_fire_at не бывает раньше now - REMINDER_LEAD"""
+    overdue_before = now - REMINDER_LEAD
+    rows = (
+        Habit.objects.filter(owner__isnull=False, next_fire_at__lt=overdue_before)
+        .values_list(*SCHEDULE_COLUMNS)
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    overdue = [
+        Habit(
+            id=pk,
+            next_fire_at=advance_fire_at(
+                next_fire_at, execution_time, periodicity, overdue_before - timedelta.resolution, get_zone(owner_tz)
+            ),
+        )
+        for pk, next_fire_at, execution_time, periodicity, owner_tz in rows
+    ]
+    Habit.objects.filter(next_fire_at__lt=overdue_before).bulk_update(
+        overdue, ["next_fire_at"], batch_size=ITERATOR_CHUNK_SIZE
+    )
+
+
+def split_into_batches(ids, batch_size):
+    """Делит упорядоченные идентификаторы на диапазоны (первый, последний) по batch_size штук"""
+    batches = []
+    first_id = last_id = None
+    count = 0
+    for pk in ids:
+        if count == 0:
+            first_id = pk
+        last_id = pk
+        count += 1
+        if count == batch_size:
+            batches.append((first_id, last_id))
+            count = 0
+    if count:
+        batches.append((first_id, last_id))
+    return batches
+
+
+def due_reminders(window_start, window_end, now=None):
+    """Наступившие напоминания, которые можно отправить: у владельца указан адрес в его канале доставки"""
+    return due_habits(window_start, window_end, now=now).filter(reachable_owner_q())
+
 
 @shared_task(name="habits.tasks.remind_habit")
 def remind_habit():
-    """Отложенная функция напоминания о привычке"""
+    """Отложенная функция напоминания о привычке.
+    Только планирует отправку: делит наступившие напоминания на диапазоны идентификаторов
+    и раздаёт их подзадачам send_habit_reminders, которые выполняются параллельно на воркерах"""
     try:
-        now = timezone.localtime()
-        start_time = now - timedelta(minutes=5)
-        end_time = now + timedelta(minutes=5)
-
-        habits = Habit.objects.filter(
-            owner__isnull=False,
-            execution_time__gte=start_time.time(),
-            execution_time__lte=end_time.time(),
-        )
+        now = timezone.now()
+        roll_forward_overdue(now)
 
-        for habit in habits:
-            if habit.owner and habit.owner.tg_chat_id:
-                message = f"Напоминаю о привычке {habit.action}"
-                send_telegram_message(habit.owner.tg_chat_id, message)
+        # Окно напоминаний - один диапазон по индексу next_fire_at
+        window_start, window_end = now - REMINDER_LEAD, now + REMINDER_LEAD
+        ids = (
+            due_reminders(window_start, window_end, now)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        )
+        batches = split_into_batches(ids, settings.REMINDER_BATCH_SIZE)
+        if batches:
+            group(
+                send_habit_reminders.s(first_id, last_id, window_start.isoformat(), window_end.isoformat())
+                for first_id, last_id in batches
+            ).apply_async()
 
     except Exception as e:
         logger.error(f"Error in remind_habit task: {e}")
         raise
 
+
+@shared_task(name="habits.tasks.send_habit_reminders")
+def send_habit_reminders(first_id, last_id, window_start, window_end):
+    """Ставит в очередь исходящих напоминания о привычках с идентификаторами из диапазона [first_id, last_id],
+    которые всё ещё попадают в окно напоминаний, и сдвигает их расписание.
+    Читает только нужные столбцы одним запросом, без загрузки моделей привычек и владельцев.
+    Очередь и расписание меняются в одной транзакции: напоминание не теряется и не дублируется"""
+    window_start = datetime.fromisoformat(window_start)
+    window_end = datetime.fromisoformat(window_end)
+
+    recipient_fields = get_recipient_fields()
+    rows = list(
+        due_reminders(window_start, window_end, now=window_start + REMINDER_LEAD)
+        .filter(id__gte=first_id, id__lte=last_id)
+        .values_list(
+            *SCHEDULE_COLUMNS,
+            "action",
+            "owner__notification_transport",
+            *(f"owner__{field}" for field in recipient_fields),
+        )
+        .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    with transaction.atomic():
+        claimed = claim_reminders((pk, next_fire_at) for pk, next_fire_at, *_ in rows)
+
+        deliveries = []
+        habits = []
+        for pk, next_fire_at, execution_time, periodicity, owner_tz, action, transport, *addresses in rows:
+            if pk in claimed:
+                transport = transport or settings.NOTIFICATION_DEFAULT_TRANSPORT
+                recipient = dict(zip(recipient_fields, addresses))[get_transport_class(transport).recipient_field]
+                deliveries.append(
+                    ReminderDelivery(
+                        habit_id=pk, transport=transport, recipient=recipient, text=f"Напоминаю о привычке {action}"
+                    )
+                )
+            next_fire_at = advance_fire_at(next_fire_at, execution_time, periodicity, window_end, get_zone(owner_tz))
+            habits.append(Habit(id=pk, next_fire_at=next_fire_at))
+
+        # Не перезаписываем расписание привычек, изменённых пользователем во время отправки
+        Habit.objects.filter(next_fire_at__lt=window_end).bulk_update(habits, ["next_fire_at"])
+        ReminderDelivery.objects.bulk_create(deliveries)
+
+    if deliveries:
+        # Доставка начинается сразу, не дожидаясь планового запуска
+        transaction.on_commit(deliver_reminders.delay)
+
+
+@shared_task(name="habits.tasks.deliver_reminders")
+def deliver_reminders():
+    """Отложенная функция доставки напоминаний из очереди исходящих.
+    Разбирает очередь пачками, пока в ней есть доставки, время которых наступило"""
+    try:
+        batch_size = settings.REMINDER_DELIVERY_BATCH_SIZE
+        total = Counter()
+        while results := drain_outbox(batch_size):
+            total.update(results)
+            if results.total() < batch_size:
+                break
+        if total:
+            logger.info(f"Reminder deliveries: {dict(total)}")
+    except Exception as e:
+        logger.error(f"Error in deliver_reminders task: {e}")
+        raise
+
+
+@shared_task(name="habits.tasks.prune_reminders")
+def prune_reminders():
+    """Отложенная функция очистки журнала отправленных напоминаний и завершённых исходящих напоминаний"""
+    try:
+        now = timezone.now()
+        occurrences, deliveries = prune_reminder_occurrences(now), prune_deliveries(now)
+        if occurrences or deliveries:
+            logger.info(f"Pruned reminder occurrences: {occurrences}, deliveries: {deliveries}")
+    except Exception as e:
+        logger.error(f"Error in prune_reminders task: {e}")
+        raise
+
+
+@shared_task(name="habits.tasks.rollup_completions")
+def rollup_completions():
+    """Отложенная функция инкрементального обновления статистики выполнения привычек"""
+    try:
+        while rollup_new_completions(settings.ROLLUP_BATCH_SIZE) == settings.ROLLUP_BATCH_SIZE:
+            pass
+    except Exception as e:
+        logger.error(f"Error in rollup_completions task: {e}")
+        raise
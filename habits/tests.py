@@ -1,14 +1,75 @@
+import csv
+import gzip
+import json
+import uuid
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from tempfile import NamedTemporaryFile
 from unittest.mock import patch, MagicMock
+from zoneinfo import ZoneInfo
 
-from django.test import TestCase
+import requests
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-from config import settings
-from habits.models import Habit, Place
-from habits.services import send_telegram_message
+from config import celery_app, settings
+from config.instrumentation import RequestMetrics, _current, record_query, registry, timed
+from habits.benchmarks import MINUTES_PER_DAY
+from habits.models import (
+    DeadRecipient,
+    ReminderDelivery,
+    CompletionRollup,
+    Habit,
+    HabitCompletion,
+    HabitStreak,
+    OwnerCompletionRollup,
+    Place,
+    ReminderOccurrence,
+)
+from habits.outbox import drain_outbox, get_outbox_stats, get_retry_delay
+from habits.renderers import FastJSONRenderer
+from habits.serializers import HabitSerializer
+from habits.scheduling import (
+    REMINDER_LEAD,
+    advance_fire_at,
+    due_habits,
+    get_next_fire_at,
+    get_zone,
+    iter_occurrences,
+)
+from habits.services import (
+    DELIVERY_REJECTED,
+    DELIVERY_RETRY,
+    DELIVERY_SENT,
+    DeliveryError,
+    TelegramSender,
+    TokenBucket,
+)
+from habits.stats import rollup_new_completions
+from habits.streaks import register_completion
+from habits.tasks import prune_reminders, remind_habit, send_habit_reminders, split_into_batches
+from habits.transports import (
+    EmailTransport,
+    LocalTransport,
+    PublicHTTPSConnection,
+    TelegramTransport,
+    WebhookTransport,
+    get_transport,
+)
 from users.models import User
 
 
@@ -119,6 +180,79 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Habit.objects.filter(id=self.habit1.id).exists())
 
+    def test_expand_related_objects(self):
+        """?expand= отдаёт место и связанную привычку вложенными объектами, загруженными тем же запросом"""
+        self.client.force_authenticate(user=self.user)
+        pleasant = Habit.objects.create(owner=self.user, action="Ванна", is_pleasant=True)
+        Habit.objects.filter(pk=self.habit1.pk).update(habit_related=pleasant)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, {"expand": "place,habit_related"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit = response.data["results"][0]
+        self.assertEqual(
+            habit["place"], {"id": self.place.id, "name": "Домашний офис", "description": "Мое рабочее место дома"}
+        )
+        self.assertEqual(habit["habit_related"], {"id": pleasant.id, "action": "Ванна", "time_required": 30})
+        self.assertEqual(response.data["results"][1]["habit_related"], None)
+
+    def test_sparse_fields(self):
+        """?fields= сокращает и поля ответа, и столбцы запроса"""
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.list_url, {"fields": "id,action,place", "expand": "place"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "action", "place"})
+        self.assertEqual(response.data["results"][0]["place"]["name"], "Домашний офис")
+        self.assertNotIn('"reward"', queries[-1]["sql"])
+
+        response = self.client.get(self.detail_url(self.habit1.id), {"fields": "action"})
+        self.assertEqual(response.data, {"action": "Привычка 1"})
+
+    def test_fast_list_matches_serializer(self):
+        """Быстрый путь списка отдаёт те же байты, что и сериализатор с JSONRenderer"""
+        self.client.force_authenticate(user=self.user)
+        pleasant = Habit.objects.create(owner=self.user, action='Ванна\u2028"с пеной"', is_pleasant=True)
+        Habit.objects.filter(pk=self.habit1.pk).update(
+            habit_related=pleasant, execution_time=time(7, 30, 15, 250), reward=None
+        )
+        Habit.objects.filter(pk=self.habit2.pk).update(place=None, reward="Кофе \x01")
+        queries = [
+            {},
+            {"expand": "place"},
+            {"pagination": "cursor", "fields": "action"},
+            {"format": "json", "page_size": 10},
+        ]
+        # В публичной ленте разворачивается только место
+        own_queries = queries + [
+            {"expand": "place,habit_related"},
+            {"fields": "action,execution_time,habit_related", "expand": "habit_related"},
+        ]
+        for url, url_queries in ((self.list_url, own_queries), (reverse("habits:public-habits-list"), queries)):
+            for params in url_queries:
+                with self.subTest(url=url, params=params):
+                    cache.clear()
+                    with patch.object(settings, "HABITS_FAST_LIST", False):
+                        expected = self.client.get(url, params, HTTP_ACCEPT="application/json")
+                    cache.clear()
+                    response = self.client.get(url, params, HTTP_ACCEPT="application/json")
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(response.content, expected.content)
+
+        # Бенчмарк сам сверяет ответы обоих путей
+        call_command("benchmark_habit_list", "--habits", "20", "--rows", "10", "--repeat", "1", stdout=StringIO())
+
+        # Рендерер совпадает с JSONRenderer и на данных с датами, ошибками и управляющими символами
+        data = {"now": timezone.now(), "day": date(2024, 2, 29), "error": ErrorDetail("Ошибка\u2029"), "items": [1.5]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_unknown_representation_fields(self):
+        """Неизвестные поля в ?fields= и ?expand= - ошибка запроса"""
+        self.client.force_authenticate(user=self.user)
+        for params in ({"fields": "id,password"}, {"expand": "owner"}):
+            response = self.client.get(self.list_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_delete_other_habit(self):
         """Пользователь не может удалить чужую привычку"""
         self.client.force_authenticate(user=self.user)
@@ -127,6 +261,447 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTrue(Habit.objects.filter(id=self.other_habit.id).exists())
 
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_benchmark_api(self):
+        """Бенчмарк API укладывается в бюджеты запросов и сравнивает результаты с эталоном"""
+        stdout = StringIO()
+        call_command(
+            "benchmark_api", "--habits", "20", "--repeat", "2", "--queries-only", "--format", "json", stdout=stdout
+        )
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report["endpoints"]["my-habits-list"]["status"], status.HTTP_200_OK)
+        self.assertEqual(report["endpoints"]["public-habits-list"]["queries"], 0)
+
+        # Эталон с меньшим количеством запросов - регрессия
+        report["endpoints"]["my-habits-list"]["queries"] -= 1
+        baseline = NamedTemporaryFile("w", suffix=".json")
+        self.addCleanup(baseline.close)
+        json.dump(report, baseline)
+        baseline.flush()
+        with self.assertRaisesMessage(CommandError, "my-habits-list"):
+            call_command(
+                "benchmark_api",
+                "--habits",
+                "20",
+                "--repeat",
+                "2",
+                "--queries-only",
+                "--baseline",
+                baseline.name,
+                stdout=StringIO(),
+            )
+
+    def test_export(self):
+        """Выгрузка отдаёт только привычки и выполнения текущего пользователя в NDJSON и CSV"""
+        self.client.force_authenticate(user=self.user)
+        HabitCompletion.objects.create(habit=self.habit1, completed_on=date(2024, 2, 29))
+        HabitCompletion.objects.create(habit=self.other_habit, completed_on=date(2024, 2, 29))
+        url = reverse("habits:my-habits-export")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="habits.ndjson"')
+        expected = b"".join(
+            JSONRenderer().render(HabitSerializer(habit).data) + b"\n" for habit in (self.habit1, self.habit2)
+        )
+        self.assertEqual(b"".join(response.streaming_content), expected)
+
+        response = self.client.get(url, {"dataset": "completions", "export_format": "csv"})
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ["id", "habit", "completed_on", "created_at"])
+        self.assertEqual([row[1:3] for row in rows[1:]], [[str(self.habit1.pk), "2024-02-29"]])
+
+        # Клиенту, принимающему gzip, выгрузка сжимается
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), expected)
+
+        # Пользовательский текст не превращается в формулу электронной таблицы
+        Habit.objects.filter(pk=self.habit1.pk).update(action='=HYPERLINK("http://evil.test")', reward="-1")
+        response = self.client.get(url, {"export_format": "csv"})
+        rows = list(csv.DictReader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual((rows[0]["action"], rows[0]["reward"]), ('\'=HYPERLINK("http://evil.test")', "'-1"))
+        self.assertEqual(rows[1]["action"], "Привычка 2")
+
+        response = self.client.get(url, {"dataset": "owners"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_accept(self):
+        """Выгрузка согласуется по Accept форматов выгрузки, ошибки отдаются в JSON"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse("habits:my-habits-export")
+
+        for accept, content_type in (
+            ("application/x-ndjson", "application/x-ndjson"),
+            ("text/csv", "text/csv; charset=utf-8"),
+            ("text/csv, application/json;q=0.5", "text/csv; charset=utf-8"),
+        ):
+            with self.subTest(accept=accept):
+                response = self.client.get(url, HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response["Content-Type"], content_type)
+                self.assertIn("Accept", response["Vary"])
+
+        # Явный формат важнее Accept
+        response = self.client.get(url, {"export_format": "ndjson"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        response = self.client.get(url, {"dataset": "owners"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("dataset", response.json())
+
+    def test_export_command(self):
+        """Команда выгружает данные всех пользователей или одного владельца"""
+        output = NamedTemporaryFile(suffix=".ndjson.gz")
+        self.addCleanup(output.close)
+        call_command("export_habits", "--gzip", "--output", output.name)
+        lines = gzip.decompress(output.read()).splitlines()
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines], [self.habit1.id, self.habit2.id, self.other_habit.id]
+        )
+
+        call_command("export_habits", "--format", "csv", "--owner", self.other_user.email, "--output", output.name)
+        output.seek(0)
+        self.assertEqual(len(output.read().decode().splitlines()), 2)
+
+        with self.assertRaisesMessage(CommandError, "nobody@example.com"):
+            call_command("export_habits", "--owner", "nobody@example.com")
+
+
+class HabitValidationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.place = Place.objects.create(name="Дом")
+        self.pleasant = Habit.objects.create(owner=self.user, action="Ванна", is_pleasant=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_save_with_loaded_relations_single_query(self):
+        """Сохранение с уже загруженными связями - один запрос"""
+        habit = Habit(owner=self.user, place=self.place, habit_related=self.pleasant, action="Зарядка")
+        with self.assertNumQueries(1):
+            habit.save()
+
+    def test_related_habit_checked_with_single_query(self):
+        """Существование и приятность связанной привычки проверяются одним запросом"""
+        habit = Habit(habit_related_id=self.pleasant.id, action="Зарядка")
+        with self.assertNumQueries(1):
+            habit.full_clean(exclude=habit.get_validated_relations())
+
+    def test_related_habit_must_exist_and_be_pleasant(self):
+        """Связанная привычка должна существовать и быть приятной"""
+        useful = Habit.objects.create(owner=self.user, action="Бег")
+        for related_id, message in ((10**6, "не существует"), (useful.id, "должна быть приятной")):
+            habit = Habit(habit_related_id=related_id, action="Зарядка")
+            with self.assertRaisesMessage(DjangoValidationError, message):
+                habit.clean()
+
+    def test_save_without_validation(self):
+        """Внутренние записи могут пропустить повторную валидацию"""
+        habit = Habit(owner=self.user, action="Зарядка", periodicity=10)
+        habit.save(validate=False)
+        self.assertTrue(Habit.objects.filter(pk=habit.pk).exists())
+
+    def test_create_habit_query_count(self):
+        """Создание через API: загрузка связей сериализатором и одна вставка"""
+        data = {"action": "Чтение", "place": self.place.id, "habit_related": self.pleasant.id, "periodicity": 1}
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse("habits:my-habits-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_detail_actions_query_count(self):
+        """Просмотр и изменение своей привычки не загружают владельца отдельным запросом"""
+        habit = Habit.objects.create(owner=self.user, action="Бег")
+        url = reverse("habits:my-habits-detail", args=[habit.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.patch(url, {"action": "Плавание"}).status_code, status.HTTP_200_OK)
+
+
+class HabitStreakTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.other_user = User.objects.create(email="other@example.com")
+        self.habit = Habit.objects.create(owner=self.user, action="Бег", periodicity=3)
+        self.other_habit = Habit.objects.create(owner=self.other_user, action="Чужая привычка")
+        self.today = timezone.localdate()
+        self.client.force_authenticate(user=self.user)
+        self.complete_url = lambda pk: reverse("habits:my-habits-complete", args=[pk])
+
+    def complete(self, days_ago):
+        return register_completion(self.habit, self.today - timedelta(days=days_ago))
+
+    def test_streak_respects_periodicity(self):
+        """Пропуск меньше периода серию не прерывает, больше - начинает новую серию"""
+        self.complete(12)
+        self.complete(9)
+        self.complete(6)
+        streak, _ = self.complete(2)
+        self.assertEqual((streak.current_streak, streak.longest_streak), (1, 3))
+
+        streak, _ = self.complete(0)
+        self.assertEqual((streak.current_streak, streak.longest_streak, streak.total_completions), (2, 3, 5))
+        self.assertEqual(streak.last_completed_on, self.today)
+
+    def test_repeated_completion_ignored(self):
+        """Повторная отметка за тот же день ничего не меняет"""
+        self.complete(0)
+        streak, created = self.complete(0)
+        self.assertFalse(created)
+        self.assertEqual((streak.current_streak, streak.total_completions), (1, 1))
+
+    def test_backdated_completion_keeps_streak(self):
+        """Отметка задним числом не меняет текущую серию"""
+        self.complete(0)
+        streak, _ = self.complete(10)
+        self.assertEqual(
+            (streak.current_streak, streak.total_completions, streak.last_completed_on), (1, 2, self.today)
+        )
+
+    def test_complete_endpoint(self):
+        """Отметка через API возвращает сводку серий"""
+        response = self.client.post(self.complete_url(self.habit.id))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["current_streak"], 1)
+        self.assertEqual(HabitCompletion.objects.filter(habit=self.habit).count(), 1)
+
+        response = self.client.post(self.complete_url(self.habit.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_complete_endpoint_rejects_future_and_foreign(self):
+        """Нельзя отметить выполнение в будущем или чужую привычку"""
+        tomorrow = self.today + timedelta(days=1)
+        response = self.client.post(self.complete_url(self.habit.id), {"completed_on": tomorrow.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.complete_url(self.other_habit.id))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_today_in_user_timezone(self):
+        """ "Сегодня" при отметке, в серии и в статистике - дата в часовом поясе пользователя, а не сервера"""
+        user = User.objects.create(email="tokyo@example.com", timezone="Asia/Tokyo")
+        habit = Habit.objects.create(owner=user, action="Утренняя зарядка", periodicity=1)
+        self.client.force_authenticate(user=user)
+        # 08:00 11 марта в Токио - ещё 10 марта по UTC
+        now = datetime(2024, 3, 10, 23, 0, tzinfo=ZoneInfo("UTC"))
+        with patch("django.utils.timezone.now", return_value=now):
+            response = self.client.post(self.complete_url(habit.id), {"completed_on": "2024-03-11"})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["current_streak"], 1)
+
+            HabitCompletion.objects.all().delete()
+            HabitStreak.objects.all().delete()
+            response = self.client.post(self.complete_url(habit.id))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["last_completed_on"], "2024-03-11")
+
+            response = self.client.get(reverse("habits:my-habits-streak", args=[habit.id]))
+            self.assertEqual(response.data["current_streak"], 1)
+            self.assertEqual(self.client.get(reverse("habits:stats")).data["end"], "2024-03-11")
+
+    def test_streak_endpoint_expired_streak(self):
+        """Серия, период которой истёк, показывается как прерванная"""
+        self.complete(5)
+        response = self.client.get(reverse("habits:my-habits-streak", args=[self.habit.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["current_streak"], response.data["longest_streak"]), (0, 1))
+
+
+class HabitStatsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.daily = Habit.objects.create(owner=self.user, action="Зарядка", periodicity=1)
+        self.weekly = Habit.objects.create(owner=self.user, action="Уборка", periodicity=7)
+        self.client.force_authenticate(user=self.user)
+        self.stats_url = reverse("habits:stats")
+
+        # Понедельник: недельные агрегаты начинаются с него
+        self.monday = date(2026, 10, 12)
+        for days in range(3):
+            register_completion(self.daily, self.monday + timedelta(days=days))
+        register_completion(self.weekly, self.monday)
+
+    def rollup(self):
+        # Без задержки безопасности только что созданные отметки сразу попадают в агрегаты
+        with patch("habits.stats.ROLLUP_SAFETY_LAG", timedelta(seconds=-1)):
+            return rollup_new_completions(100)
+
+    def get_rollup(self, period, period_start, habit=None):
+        if habit is None:
+            return OwnerCompletionRollup.objects.get(owner=self.user, period=period, period_start=period_start)
+        return CompletionRollup.objects.get(habit=habit, period=period, period_start=period_start)
+
+    def test_rollup_is_incremental(self):
+        """Каждая отметка учитывается в агрегатах ровно один раз"""
+        self.assertEqual(self.rollup(), 4)
+        self.assertEqual(self.rollup(), 0)
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_DAY, self.monday, self.daily).completions, 1)
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_WEEK, self.monday, self.daily).completions, 3)
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_WEEK, self.monday).completions, 4)
+
+        register_completion(self.weekly, self.monday + timedelta(days=1))
+        self.assertEqual(self.rollup(), 1)
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_WEEK, self.monday).completions, 5)
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_DAY, self.monday + timedelta(days=1)).completions, 2)
+
+    def test_rollup_waits_for_safety_lag(self):
+        """Только что созданные отметки ждут, пока завершатся параллельные транзакции"""
+        self.assertEqual(rollup_new_completions(100), 0)
+        self.assertFalse(OwnerCompletionRollup.objects.exists())
+
+    def test_backfill_command(self):
+        """Пересчёт по всей истории даёт те же агрегаты, что и инкрементальное обновление"""
+        self.rollup()
+        OwnerCompletionRollup.objects.update(completions=0)
+        with patch("habits.stats.ROLLUP_SAFETY_LAG", timedelta(seconds=-1)):
+            call_command("backfill_completion_rollups", stdout=StringIO())
+        self.assertEqual(self.get_rollup(CompletionRollup.PERIOD_WEEK, self.monday).completions, 4)
+        self.assertEqual(CompletionRollup.objects.count(), 6)
+
+    def test_stats_endpoint(self):
+        """Статистика по неделям и дням с процентом соблюдения расписания"""
+        self.rollup()
+        end = self.monday + timedelta(days=6)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.stats_url, {"period": "week", "start": self.monday, "end": end})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Ожидается 7 выполнений ежедневной привычки и одно еженедельной
+        self.assertEqual((response.data["completions"], response.data["adherence"]), (4, 50.0))
+        self.assertEqual(
+            [(habit["habit"], habit["completions"], habit["adherence"]) for habit in response.data["habits"]],
+            [(self.daily.id, 3, 42.9), (self.weekly.id, 1, 100.0)],
+        )
+
+        response = self.client.get(self.stats_url, {"start": self.monday, "end": self.monday + timedelta(days=3)})
+        self.assertEqual(
+            [(bucket["completions"], bucket["adherence"]) for bucket in response.data["buckets"]],
+            [(2, 100.0), (1, 87.5), (1, 87.5), (0, 0.0)],
+        )
+
+    def test_stats_endpoint_validation(self):
+        """Неверный интервал отклоняется, без авторизации статистика недоступна"""
+        response = self.client.get(self.stats_url, {"start": self.monday, "end": self.monday - timedelta(days=1)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.stats_url, {"start": self.monday - timedelta(days=400), "end": self.monday})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class HabitBulkTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.other_user = User.objects.create(email="other@example.com")
+        self.place = Place.objects.create(name="Дом")
+        self.pleasant = Habit.objects.create(owner=self.user, action="Ванна", is_pleasant=True)
+        self.habit = Habit.objects.create(owner=self.user, action="Зарядка", reward="Кофе")
+        self.other_habit = Habit.objects.create(owner=self.other_user, action="Чужая привычка")
+        self.client.force_authenticate(user=self.user)
+        self.bulk_url = reverse("habits:my-habits-bulk")
+
+    def test_bulk_create(self):
+        """Пакет привычек создаётся одним запросом с текущим владельцем"""
+        data = [
+            {"action": "Бег", "place": self.place.id, "periodicity": 2, "execution_time": "07:00"},
+            {"action": "Чтение", "habit_related": self.pleasant.id, "periodicity": 1},
+            {"action": "Прогулка", "reward": "Мороженое", "periodicity": 3, "owner": self.other_user.id},
+        ]
+        response = self.client.post(self.bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([habit["action"] for habit in response.data], ["Бег", "Чтение", "Прогулка"])
+
+        habits = Habit.objects.filter(id__in=[habit["id"] for habit in response.data])
+        self.assertEqual({habit.owner_id for habit in habits}, {self.user.id})
+        self.assertIsNotNone(habits.get(action="Бег").next_fire_at)
+        self.assertEqual(habits.get(action="Чтение").habit_related, self.pleasant)
+
+    def test_bulk_create_query_count(self):
+        """Количество запросов пакетного создания не зависит от размера пакета"""
+        data = [
+            {
+                "action": f"Привычка {number}",
+                "place": self.place.id,
+                "habit_related": self.pleasant.id,
+                "periodicity": 1,
+            }
+            for number in range(10)
+        ]
+        # Загрузка мест, загрузка связанных привычек, вставка в точке сохранения транзакции
+        with self.assertNumQueries(5):
+            response = self.client.post(self.bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_create_rejects_whole_batch(self):
+        """При ошибке в любом элементе ничего не создаётся, ошибки возвращаются по элементам"""
+        data = [
+            {"action": "Бег", "periodicity": 1},
+            {"action": "Чтение", "habit_related": self.habit.id, "periodicity": 1},
+            {"action": "Прогулка", "place": 10**6, "periodicity": 1},
+            {"action": "Сон", "periodicity": 10},
+        ]
+        response = self.client.post(self.bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("habit_related", response.data[1])
+        self.assertIn("place", response.data[2])
+        self.assertIn("periodicity", response.data[3])
+        self.assertFalse(Habit.objects.filter(action="Бег").exists())
+
+    def test_foreign_related_habit_rejected(self):
+        """Чужую приятную привычку нельзя связать ни по одной, ни пакетом, и её действие не читается"""
+        secret = Habit.objects.create(owner=self.other_user, action="Секретная приятная", is_pleasant=True)
+        detail_url = reverse("habits:my-habits-detail", args=[self.habit.id])
+        response = self.client.patch(detail_url, {"habit_related": secret.id, "reward": None}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("habit_related", response.data)
+
+        for method in (self.client.post, self.client.patch):
+            item = {"action": "Чтение", "periodicity": 1, "habit_related": secret.id}
+            if method == self.client.patch:
+                item = {"id": self.habit.id, "habit_related": secret.id}
+            response = method(self.bulk_url, [item], format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("habit_related", response.data[0])
+
+        response = self.client.get(reverse("habits:my-habits-list"), {"expand": "habit_related"})
+        self.assertNotIn("Секретная приятная", response.content.decode())
+
+    def test_bulk_update(self):
+        """Пакетное изменение затрагивает только привычки пользователя"""
+        data = [{"id": self.habit.id, "habit_related": self.pleasant.id}, {"id": self.pleasant.id, "action": "Душ"}]
+        response = self.client.patch(self.bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.habit_related, self.pleasant)
+        self.assertIsNone(self.habit.reward)
+        self.pleasant.refresh_from_db()
+        self.assertEqual(self.pleasant.action, "Душ")
+
+        response = self.client.patch(self.bulk_url, [{"id": self.other_habit.id, "action": "Взлом"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("id", response.data[0])
+
+    def test_bulk_delete(self):
+        """Пакетное удаление возвращает результат по каждому id"""
+        response = self.client.delete(self.bulk_url, [self.habit.id, self.other_habit.id], format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data, [{"id": self.habit.id, "deleted": True}, {"id": self.other_habit.id, "deleted": False}]
+        )
+        self.assertFalse(Habit.objects.filter(id=self.habit.id).exists())
+        self.assertTrue(Habit.objects.filter(id=self.other_habit.id).exists())
+
+    def test_bulk_requires_list(self):
+        """Тело пакетного запроса - непустой список"""
+        response = self.client.post(self.bulk_url, {"action": "Бег"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class PublicHabitTestCase(APITestCase):
     def setUp(self):
@@ -167,6 +742,8 @@ class PublicHabitTestCase(APITestCase):
             time_required=30,
         )
 
+        cache.clear()
+
         # URL для API
         self.list_url = reverse("habits:public-habits-list")
         self.detail_url = lambda pk: reverse("habits:public-habits-detail", args=[pk])
@@ -185,7 +762,121 @@ class PublicHabitTestCase(APITestCase):
         self.assertIn(self.public_habit2.id, habit_ids)
         self.assertNotIn(self.private_habit.id, habit_ids)
 
+    def test_public_list_ordered_by_id(self):
+        """Лента публичных привычек упорядочена по id"""
+        response = self.client.get(self.list_url)
+        habit_ids = [habit["id"] for habit in response.data["results"]]
+        self.assertEqual(habit_ids, sorted(habit_ids))
+
+    def test_cursor_pagination(self):
+        """Курсорный режим пагинации включается параметром pagination=cursor"""
+        response = self.client.get(self.list_url, {"pagination": "cursor", "page_size": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual([habit["id"] for habit in response.data["results"]], [self.public_habit1.id])
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([habit["id"] for habit in response.data["results"]], [self.public_habit2.id])
+        self.assertIsNone(response.data["next"])
+
+    def test_public_list_served_from_cache(self):
+        """Повторный запрос ленты обслуживается из кеша без обращений к базе"""
+        response = self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.list_url)
+        self.assertEqual(cached_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response["ETag"], response["ETag"])
+
+    def test_browsable_api_not_cached(self):
+        """Страница Browsable API не кешируется: в ней CSRF-токен запросившего клиента"""
+        self.client.get(self.list_url, HTTP_ACCEPT="text/html")
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+
+        first = self.client_class().get(self.list_url, {"format": "api"}).content.decode()
+        second = self.client_class().get(self.list_url, {"format": "api"}).content.decode()
+        self.assertIn("drf_csrf", first)
+        self.assertNotEqual(first, second)
+
+    def test_public_list_not_modified(self):
+        """Клиент с актуальным ETag получает 304"""
+        etag = self.client.get(self.list_url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_public_list_cache_reset_on_change(self):
+        """Изменение публичных привычек сбрасывает кеш ленты"""
+        etag = self.client.get(self.list_url)["ETag"]
+
+        self.private_habit.is_published = True
+        self.private_habit.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 3)
+
+        self.public_habit1.delete()
+        self.assertEqual(self.client.get(self.list_url).json()["count"], 2)
+
+    def test_public_list_cache_reset_on_set_null(self):
+        """Удаление владельца или связанной привычки публичных привычек сбрасывает кеш ленты"""
+        pleasant = Habit.objects.create(owner=self.user, action="Приятная", is_pleasant=True)
+        Habit.objects.filter(pk=self.public_habit1.pk).update(habit_related=pleasant)
+        habit = self.client.get(self.detail_url(self.public_habit1.id)).json()
+        self.assertEqual(habit["habit_related"], pleasant.id)
+        self.assertEqual(self.client.get(self.list_url).json()["results"][0]["habit_related"], pleasant.id)
+
+        pleasant.delete()
+        self.assertIsNone(self.client.get(self.list_url).json()["results"][0]["habit_related"])
+
+        etag = self.client.get(self.list_url)["ETag"]
+        self.user.delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()["results"][0]["owner"])
+
+    def test_private_habit_change_keeps_cache(self):
+        """Изменение приватной привычки не сбрасывает кеш ленты"""
+        etag = self.client.get(self.list_url)["ETag"]
+        self.private_habit.action = "Новое действие"
+        self.private_habit.save()
+        self.assertEqual(self.client.get(self.list_url)["ETag"], etag)
+
+    def test_expanded_feed_reset_on_place_change(self):
+        """Развёрнутое место в ленте обновляется после изменения места"""
+        response = self.client.get(self.list_url, {"expand": "place"})
+        self.assertEqual(response.json()["results"][0]["place"]["name"], "Парк")
+
+        self.place.name = "Сквер"
+        self.place.save()
+        response = self.client.get(self.list_url, {"expand": "place"})
+        self.assertEqual(response.json()["results"][0]["place"]["name"], "Сквер")
+
+    def test_private_related_habit_not_expanded(self):
+        """Связанная приятная привычка в ленте не разворачивается: она может быть не опубликована"""
+        pleasant = Habit.objects.create(owner=self.user, action="Секретная приятная", is_pleasant=True)
+        Habit.objects.filter(pk=self.public_habit1.pk).update(habit_related=pleasant)
+        for url in (self.list_url, self.detail_url(self.public_habit1.id)):
+            for params in ({"expand": "habit_related"}, {"expand": "place,habit_related", "format": "api"}):
+                with self.subTest(url=url, params=params):
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                    self.assertNotIn("Секретная приятная", response.content.decode())
+
+        habit = self.client.get(self.list_url, {"expand": "place"}).json()["results"][0]
+        self.assertEqual(habit["habit_related"], pleasant.id)
+
     # Тест для деталей публичной привычки
+    def test_unauthenticated_access_to_detail(self):
+        """Неаутентифицированный пользователь может получить публичную привычку"""
+        response = self.client.get(self.detail_url(self.public_habit1.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["id"], self.public_habit1.id)
+
     def test_access_to_private_habit_detail(self):
         """Нельзя получить детали приватной привычки через публичный эндпоинт"""
         response = self.client.get(self.detail_url(self.private_habit.id))
@@ -242,3 +933,667 @@ class PlaceTestCase(APITestCase):
         response = self.client.post(self.place_create_url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("name", response.data)
+
+
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        Habit.objects.create(owner=self.user, action="Бег")
+        self.client.force_authenticate(user=self.user)
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def instrumentation(self, **overrides):
+        options = {"INSTRUMENTATION_ENABLED": True, "INSTRUMENTATION_SAMPLE_RATE": 1, "METRICS_TOKEN": "secret"}
+        return patch.multiple(settings, **{**options, **overrides})
+
+    def test_server_timing_and_metrics(self):
+        """Замеры запроса попадают в заголовок Server-Timing и в счётчики для Prometheus"""
+        with self.instrumentation():
+            response = self.client.get(reverse("habits:my-habits-list"))
+            metrics = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret").content.decode()
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="2 queries", .*serialize;dur=[\d.]+.*render;dur=[\d.]+.*total;dur=',
+        )
+        self.assertIn('http_request_phase_seconds_total{view="HabitViewSet.list",phase="serialize"}', metrics)
+        self.assertIn('http_requests_total{view="HabitViewSet.list",status="200"} 1', metrics)
+        self.assertIn('http_request_db_queries_total{view="HabitViewSet.list"} 2', metrics)
+        self.assertIn('http_request_duration_seconds_count{view="HabitViewSet.list"} 1', metrics)
+        self.assertIn('http_request_phase_seconds_total{view="HabitViewSet.list",phase="render"}', metrics)
+
+    def test_disabled(self):
+        """Выключенные замеры не добавляют заголовок, счётчики недоступны"""
+        with self.instrumentation(INSTRUMENTATION_ENABLED=False):
+            response = self.client.get(reverse("habits:my-habits-list"))
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_sampling(self):
+        """Незамеряемые запросы не попадают в счётчики"""
+        with self.instrumentation(INSTRUMENTATION_SAMPLE_RATE=0):
+            response = self.client.get(reverse("habits:my-habits-list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertNotIn("HabitViewSet.list", registry.render())
+
+    def test_metrics_token(self):
+        """Счётчики отдаются только по токену, без заданного токена - недоступны"""
+        with self.instrumentation():
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.instrumentation(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_serializer_phase(self):
+        """Сериализация замеряется отдельным этапом и через сериализатор, и в быстром пути"""
+        habit = Habit.objects.get()
+        for fast_list in (True, False):
+            with self.subTest(fast_list=fast_list), self.instrumentation(), patch.object(
+                settings, "HABITS_FAST_LIST", fast_list
+            ):
+                response = self.client.get(reverse("habits:my-habits-list"))
+                self.assertIn("serialize;dur=", response["Server-Timing"])
+        with self.instrumentation():
+            response = self.client.get(reverse("habits:my-habits-detail", args=[habit.id]))
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+
+    def test_phases_exclude_nested_queries(self):
+        """SQL внутри этапа считается только в db, вложенный этап - только в своём"""
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        self.addCleanup(_current.reset, token)
+        # Начало auth, начало и конец SQL, начало и конец serialize, конец auth
+        clock = iter([0, 1, 4, 5, 6, 10])
+        with patch("config.instrumentation.time.perf_counter", side_effect=lambda: next(clock)):
+            with timed("auth"):
+                record_query(lambda *args: None, "SELECT 1", (), False, {})
+                with timed("serialize"):
+                    pass
+
+        self.assertEqual(dict(metrics.phases), {"db": 3, "serialize": 1, "auth": 6})
+        self.assertEqual(metrics.queries, 1)
+
+
+class SchedulingTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com")
+        self.now = timezone.now()
+        execution_time = timezone.localtime(self.now + timedelta(minutes=2)).time()
+        self.daily = Habit.objects.create(owner=self.user, action="Каждый день", execution_time=execution_time)
+        self.every_other_day = Habit.objects.create(
+            owner=self.user, action="Через день", execution_time=execution_time, periodicity=2
+        )
+        self.client.force_authenticate(user=self.user)
+        self.upcoming_url = reverse("habits:my-habits-upcoming")
+
+    def test_due_habits_respects_periodicity(self):
+        """Привычка с периодичностью 2 дня не выполняется завтра"""
+        start = self.now + timedelta(days=1)
+        due = set(due_habits(start, start + timedelta(minutes=10), now=self.now))
+        self.assertEqual(due, {self.daily})
+
+        start = self.now + timedelta(days=2)
+        due = set(due_habits(start, start + timedelta(minutes=10), now=self.now))
+        self.assertEqual(due, {self.daily, self.every_other_day})
+
+    def test_iter_occurrences(self):
+        """Выполнения привычки идут с шагом periodicity дней"""
+        occurrences = list(iter_occurrences(self.every_other_day, self.now, self.now + timedelta(days=7)))
+        first = self.every_other_day.next_fire_at
+        self.assertEqual(occurrences, [first + timedelta(days=days) for days in (0, 2, 4, 6)])
+
+    def test_next_fire_at_in_owner_timezone(self):
+        """Время выполнения задаётся в часовом поясе владельца"""
+        user = User.objects.create(email="moscow@example.com", timezone="Europe/Moscow")
+        habit = Habit.objects.create(owner=user, action="Зарядка", execution_time=time(9, 0))
+        self.assertEqual(timezone.localtime(habit.next_fire_at, get_zone("UTC")).time(), time(6, 0))
+
+    def test_advance_keeps_local_time_across_dst(self):
+        """После перехода на летнее время напоминание приходит в то же местное время"""
+        tz = get_zone("America/New_York")
+        fire_at = datetime(2026, 3, 7, 9, 0, tzinfo=tz)
+        next_fire_at = advance_fire_at(fire_at, time(9, 0), 1, fire_at, tz)
+        self.assertEqual(next_fire_at.timestamp() - fire_at.timestamp(), timedelta(hours=23).total_seconds())
+        self.assertEqual(timezone.localtime(next_fire_at, tz).time(), time(9, 0))
+
+    def test_timezone_change_reschedules_habits(self):
+        """Смена часового пояса сохраняет местное время выполнения и цикл периодичности"""
+        fire_at = timezone.localtime(self.every_other_day.next_fire_at)
+        self.user.timezone = "Asia/Tokyo"
+        self.user.save()
+        self.every_other_day.refresh_from_db()
+
+        local_fire_at = timezone.localtime(self.every_other_day.next_fire_at, get_zone("Asia/Tokyo"))
+        self.assertEqual(local_fire_at.time(), fire_at.time())
+        self.assertEqual((local_fire_at.date() - fire_at.date()).days % 2, 0)
+        self.assertGreater(self.every_other_day.next_fire_at, self.now)
+
+    def test_upcoming_reminders(self):
+        """API возвращает предстоящие напоминания с учётом периодичности"""
+        response = self.client.get(self.upcoming_url, {"days": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit_ids = [reminder["habit"] for reminder in response.data]
+        self.assertEqual(habit_ids.count(self.daily.id), 3)
+        self.assertEqual(habit_ids.count(self.every_other_day.id), 2)
+
+    def test_upcoming_reminders_invalid_days(self):
+        """Количество дней ограничено максимальной периодичностью"""
+        response = self.client.get(self.upcoming_url, {"days": 30})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def sent_messages():
+    """Все напоминания, поставленные в очередь исходящих"""
+    return list(ReminderDelivery.objects.order_by("id").values_list("recipient", "text"))
+
+
+class RemindHabitTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="user@example.com", tg_chat_id="123")
+        self.now = timezone.now()
+        self.habit = Habit.objects.create(
+            owner=self.user,
+            action="Зарядка",
+            execution_time=timezone.localtime(self.now + timedelta(minutes=2)).time(),
+            periodicity=2,
+        )
+        # Подзадачи отправки выполняются синхронно, без брокера
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, "task_always_eager", False)
+
+    def test_next_fire_at_calculated_on_save(self):
+        """При сохранении рассчитывается ближайший момент напоминания"""
+        self.assertIsNotNone(self.habit.next_fire_at)
+        self.assertTrue(self.now < self.habit.next_fire_at <= self.now + timedelta(minutes=2))
+
+    def test_next_fire_at_recalculated_on_time_change(self):
+        """Изменение времени выполнения пересчитывает расписание, сохраняя цикл периодичности"""
+        self.habit.execution_time = timezone.localtime(self.now - timedelta(hours=1)).time()
+        self.habit.save()
+        self.habit.refresh_from_db()
+        # Сегодняшнее выполнение уже прошло, следующее - через periodicity дней
+        self.assertTrue(self.now + timedelta(hours=46) < self.habit.next_fire_at <= self.now + timedelta(hours=47))
+
+    def test_next_fire_at_follows_periodicity_change(self):
+        """Сокращение периодичности отсчитывается от последнего напоминания и приближает следующее,
+        увеличение - оставляет ближайшее напоминание на месте"""
+        self.habit.periodicity = 7
+        self.habit.save()
+        fire_at = self.habit.next_fire_at
+        remind_habit()
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=7))
+
+        self.habit.periodicity = 1
+        self.habit.save()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=1))
+
+        self.habit.periodicity = 3
+        self.habit.save()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=1))
+
+    def test_habit_without_owner_not_scheduled(self):
+        """Привычки без владельца не попадают в расписание"""
+        habit = Habit.objects.create(action="Ничья", execution_time=self.habit.execution_time)
+        self.assertIsNone(habit.next_fire_at)
+
+    def test_remind_habit_sends_once_and_advances(self):
+        """Задача отправляет наступившее напоминание и сдвигает его на период"""
+        fire_at = self.habit.next_fire_at
+        remind_habit()
+        remind_habit()
+
+        self.assertEqual(sent_messages(), [("123", "Напоминаю о привычке Зарядка")])
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=2))
+
+    def test_every_minute_of_day_reminded_once(self):
+        """Задача, запускаемая каждую минуту в течение суток, напоминает о привычке с любым временем
+        выполнения ровно один раз и не позже этого времени, в том числе в окнах, пересекающих полночь"""
+        self.habit.delete()
+        user = User.objects.create(email="night@example.com", tg_chat_id="456")
+        start = datetime(2030, 1, 15, 12, 0, tzinfo=get_zone("UTC"))
+        Habit.objects.bulk_create(
+            Habit(
+                owner=user,
+                action=str(minute),
+                execution_time=time(minute // 60, minute % 60),
+                next_fire_at=get_next_fire_at(time(minute // 60, minute % 60), start),
+            )
+            for minute in range(MINUTES_PER_DAY)
+        )
+
+        reminded = {}
+        for tick in range(MINUTES_PER_DAY):
+            with patch("django.utils.timezone.now", return_value=start + timedelta(minutes=tick)):
+                remind_habit()
+            for delivery in ReminderDelivery.objects.filter(habit__isnull=False):
+                minute = int(delivery.text.rsplit(" ", 1)[1])
+                reminded.setdefault(minute, []).append((start.hour * 60 + tick) % MINUTES_PER_DAY)
+            ReminderDelivery.objects.update(habit=None)
+
+        self.assertEqual(sorted(reminded), list(range(MINUTES_PER_DAY)))
+        for minute, ticks in reminded.items():
+            # Привычки 12:00-12:03 успевают напомнить о себе и на следующие сутки, до конца прогона
+            self.assertEqual(len(ticks), 2 if 12 * 60 <= minute < 12 * 60 + 4 else 1, minute)
+            for tick in ticks:
+                self.assertLess((minute - tick) % MINUTES_PER_DAY, REMINDER_LEAD.seconds // 60, minute)
+
+    def test_remind_habit_in_owner_timezone(self):
+        """Напоминание приходит по местному времени владельца, а не сервера"""
+        tz = get_zone("Asia/Tokyo")
+        user = User.objects.create(email="tokyo@example.com", tg_chat_id="456", timezone="Asia/Tokyo")
+        Habit.objects.create(
+            owner=user, action="Чай", execution_time=timezone.localtime(self.now + timedelta(minutes=2), tz).time()
+        )
+        remind_habit()
+        self.assertIn(("456", "Напоминаю о привычке Чай"), sent_messages())
+
+    def test_remind_habit_records_occurrence(self):
+        """Каждое отправленное напоминание фиксируется в журнале"""
+        fire_at = self.habit.next_fire_at
+        remind_habit()
+        self.assertTrue(ReminderOccurrence.objects.filter(habit=self.habit, scheduled_for=fire_at).exists())
+
+    def test_remind_habit_skips_claimed_occurrence(self):
+        """Напоминание, уже захваченное параллельным запуском, повторно не отправляется"""
+        fire_at = self.habit.next_fire_at
+        ReminderOccurrence.objects.create(habit=self.habit, scheduled_for=fire_at, claim=uuid.uuid4())
+        remind_habit()
+
+        self.assertEqual(sent_messages(), [])
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=2))
+
+    @patch("habits.tasks.settings.PRUNE_BATCH_SIZE", 2)
+    def test_prune_reminders(self):
+        """Старые записи журнала удаляются пачками, записи около текущего окна остаются"""
+        retention = timedelta(days=settings.REMINDER_OCCURRENCE_RETENTION_DAYS)
+        for days in range(5):
+            ReminderOccurrence.objects.create(
+                habit=self.habit, scheduled_for=self.now - retention - timedelta(days=days + 1), claim=uuid.uuid4()
+            )
+        recent = ReminderOccurrence.objects.create(habit=self.habit, scheduled_for=self.now, claim=uuid.uuid4())
+
+        # Завершённые доставки удаляются по сроку хранения, ожидающие - никогда
+        old = self.now - timedelta(days=settings.REMINDER_DELIVERY_RETENTION_DAYS + 1)
+        for status_name in ("pending", "sending", "sent", "failed"):
+            ReminderDelivery.objects.create(recipient="1", text="Старое", status=status_name)
+        ReminderDelivery.objects.update(created_at=old)
+        ReminderDelivery.objects.create(recipient="1", text="Новое", status=ReminderDelivery.STATUS_SENT)
+
+        prune_reminders()
+        self.assertEqual(list(ReminderOccurrence.objects.all()), [recent])
+        self.assertEqual(
+            sorted(ReminderDelivery.objects.values_list("status", flat=True)), ["pending", "sending", "sent"]
+        )
+
+    def test_remind_habit_rolls_forward_overdue(self):
+        """Пропущенное напоминание сдвигается по периодичности без отправки"""
+        fire_at = self.habit.next_fire_at
+        Habit.objects.filter(pk=self.habit.pk).update(next_fire_at=fire_at - timedelta(days=2))
+        Habit.objects.filter(pk=self.habit.pk).update(periodicity=3)
+        remind_habit()
+
+        self.assertEqual(sent_messages(), [])
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=1))
+
+    @patch("habits.tasks.settings.REMINDER_BATCH_SIZE", 1)
+    def test_remind_habit_fans_out_batches(self):
+        """Наступившие напоминания раздаются подзадачам по диапазонам идентификаторов"""
+        other = Habit.objects.create(owner=self.user, action="Чтение", execution_time=self.habit.execution_time)
+        with patch("habits.tasks.send_habit_reminders.s", wraps=send_habit_reminders.s) as mock_signature:
+            remind_habit()
+
+        self.assertEqual(
+            [call.args[:2] for call in mock_signature.call_args_list], [(pk, pk) for pk in (self.habit.pk, other.pk)]
+        )
+        self.assertEqual(
+            sorted(sent_messages()),
+            [("123", "Напоминаю о привычке Зарядка"), ("123", "Напоминаю о привычке Чтение")],
+        )
+
+    def test_send_habit_reminders_query_count(self):
+        """Количество запросов подзадачи не зависит от числа привычек и владельцев"""
+        for number in range(5):
+            owner = User.objects.create(email=f"owner{number}@example.com", tg_chat_id=str(number))
+            Habit.objects.create(owner=owner, action=f"Привычка {number}", execution_time=self.habit.execution_time)
+
+        window_start, window_end = self.now - REMINDER_LEAD, self.now + REMINDER_LEAD
+        # Чтение столбцов, вставка и чтение журнала, сдвиг расписания, вставка в очередь исходящих
+        # и SAVEPOINT/RELEASE транзакции
+        with self.assertNumQueries(7):
+            send_habit_reminders(0, 10**9, window_start.isoformat(), window_end.isoformat())
+        self.assertEqual(len(sent_messages()), 6)
+
+    def test_remind_habit_skips_owner_without_chat(self):
+        """Владельцам без телеграма напоминания не отправляются, расписание сдвигается позже"""
+        self.user.tg_chat_id = None
+        self.user.save()
+        fire_at = self.habit.next_fire_at
+        remind_habit()
+        self.assertEqual(sent_messages(), [])
+
+        with patch("habits.tasks.timezone.now", return_value=fire_at + REMINDER_LEAD * 2):
+            remind_habit()
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, fire_at + timedelta(days=2))
+
+    def test_split_into_batches(self):
+        """Идентификаторы делятся на диапазоны фиксированного размера"""
+        self.assertEqual(split_into_batches([1, 2, 5, 8, 9], 2), [(1, 2), (5, 8), (9, 9)])
+        self.assertEqual(split_into_batches([], 2), [])
+
+    def test_remind_habit_skips_not_due(self):
+        """Привычки, время которых не наступило, не читаются и не напоминаются"""
+        self.habit.execution_time = timezone.localtime(self.now + timedelta(hours=1)).time()
+        self.habit.save()
+        remind_habit()
+        self.assertEqual(sent_messages(), [])
+
+
+class ReminderOutboxTestCase(TestCase):
+    def setUp(self):
+        self.delivery = ReminderDelivery.objects.create(recipient="123", text="Напоминаю о привычке Зарядка")
+        self.now = timezone.now()
+        patcher = patch("habits.outbox.get_transport")
+        self.sender = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def deliver(self, *outcomes, now=None):
+        self.sender.deliver_many.side_effect = lambda messages: [outcomes[0] for _ in messages]
+        return drain_outbox(10, now=now or self.now)
+
+    def test_drain_marks_sent(self):
+        """Доставленное напоминание помечается отправленным и больше не выбирается"""
+        self.assertEqual(self.deliver((DELIVERY_SENT, "")), {DELIVERY_SENT: 1})
+        self.delivery.refresh_from_db()
+        self.assertEqual((self.delivery.status, self.delivery.attempts), (ReminderDelivery.STATUS_SENT, 1))
+        self.assertEqual(self.deliver((DELIVERY_SENT, "")), {})
+
+    def test_drain_retries_with_backoff(self):
+        """Временная ошибка откладывает доставку с нарастающей задержкой, после всех попыток - отказ"""
+        self.deliver((DELIVERY_RETRY, "нет сети"))
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(self.delivery.next_attempt_at, self.now + get_retry_delay(1))
+        # До следующей попытки доставка не выбирается
+        self.assertEqual(self.deliver((DELIVERY_SENT, "")), {})
+
+        ReminderDelivery.objects.update(attempts=settings.REMINDER_DELIVERY_MAX_ATTEMPTS - 1)
+        self.deliver((DELIVERY_RETRY, "нет сети"), now=self.now + timedelta(days=1))
+        self.delivery.refresh_from_db()
+        self.assertEqual(
+            (self.delivery.status, self.delivery.last_error), (ReminderDelivery.STATUS_FAILED, "нет сети")
+        )
+        self.assertEqual(get_retry_delay(20), timedelta(seconds=settings.REMINDER_DELIVERY_MAX_BACKOFF))
+
+    def test_rejected_recipient_moves_to_dead_letter(self):
+        """Отклонённый телеграмом получатель попадает в список недоступных, новые напоминания ему не отправляются"""
+        self.deliver((DELIVERY_REJECTED, "403: Forbidden"))
+        self.assertTrue(DeadRecipient.objects.filter(recipient="123").exists())
+
+        ReminderDelivery.objects.create(recipient="123", text="Ещё одно")
+        self.assertEqual(self.deliver((DELIVERY_SENT, ""), now=timezone.now()), {"skipped": 1})
+        self.assertFalse(ReminderDelivery.objects.filter(status=ReminderDelivery.STATUS_PENDING).exists())
+
+    def test_reminders_delivered_after_commit(self):
+        """Напоминание попадает в очередь вместе со сдвигом расписания, доставка запускается после фиксации"""
+        user = User.objects.create(email="user@example.com", tg_chat_id="456")
+        Habit.objects.create(
+            owner=user, action="Чтение", execution_time=timezone.localtime(self.now + timedelta(minutes=2)).time()
+        )
+        window_start, window_end = self.now - REMINDER_LEAD, self.now + REMINDER_LEAD
+        with patch("habits.tasks.deliver_reminders.delay") as mock_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                send_habit_reminders(0, 10**9, window_start.isoformat(), window_end.isoformat())
+        mock_delay.assert_called_once()
+        self.assertTrue(ReminderDelivery.objects.filter(recipient="456", status=ReminderDelivery.STATUS_PENDING))
+
+    def test_drain_sends_outside_transaction(self):
+        """Доставки забираются короткой транзакцией: во время отправки они уже помечены отправляемыми"""
+        statuses = []
+
+        def deliver_many(messages):
+            messages = list(messages)
+            statuses.append(ReminderDelivery.objects.get(pk=self.delivery.pk).status)
+            return [(DELIVERY_SENT, "")] * len(messages)
+
+        self.sender.deliver_many.side_effect = deliver_many
+        self.assertEqual(drain_outbox(10, now=self.now), {DELIVERY_SENT: 1})
+        self.assertEqual(statuses, [ReminderDelivery.STATUS_SENDING])
+
+    def test_expired_lease_is_reclaimed(self):
+        """Доставку, воркер которой упал во время отправки, забирает другой воркер после окончания аренды"""
+        self.sender.deliver_many.side_effect = RuntimeError("воркер остановлен")
+        with self.assertRaises(RuntimeError):
+            drain_outbox(10, now=self.now)
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, ReminderDelivery.STATUS_SENDING)
+        self.assertEqual(self.deliver((DELIVERY_SENT, "")), {})
+
+        lease_end = self.now + timedelta(seconds=settings.REMINDER_DELIVERY_LEASE)
+        self.assertEqual(self.deliver((DELIVERY_SENT, ""), now=lease_end), {DELIVERY_SENT: 1})
+        self.delivery.refresh_from_db()
+        self.assertEqual((self.delivery.status, self.delivery.attempts), (ReminderDelivery.STATUS_SENT, 2))
+
+        # Сообщение, на котором воркер падает каждый раз, после всех попыток считается недоставленным
+        ReminderDelivery.objects.filter(pk=self.delivery.pk).update(
+            status=ReminderDelivery.STATUS_SENDING,
+            attempts=settings.REMINDER_DELIVERY_MAX_ATTEMPTS,
+            next_attempt_at=self.now,
+        )
+        self.assertEqual(self.deliver((DELIVERY_SENT, ""), now=lease_end), {})
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, ReminderDelivery.STATUS_FAILED)
+
+    def test_retry_after_sets_next_attempt(self):
+        """retry_after из ответа 429 переносится в время следующей попытки"""
+        self.deliver((DELIVERY_RETRY, DeliveryError("429: Too Many Requests", retry_after=7)))
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, ReminderDelivery.STATUS_PENDING)
+        self.assertEqual(self.delivery.next_attempt_at, self.now + timedelta(seconds=7))
+
+    def test_outbox_stats(self):
+        """Состояние очереди показывает ожидающие доставки и их возраст"""
+        stats = get_outbox_stats(now=self.now + timedelta(minutes=1))
+        self.assertEqual((stats["pending"], stats["due"], stats["failed"]), (1, 1, 0))
+        self.assertGreaterEqual(stats["oldest_pending_age"], 0)
+
+
+class TransportTestCase(TestCase):
+    def test_local_transport_batches_and_records(self):
+        """Локальный канал отправляет пачками и запоминает сообщения со временем доставки"""
+        transport = LocalTransport(latency=0)
+        results = transport.deliver_many((f"user{number}@example.com", "Привет") for number in range(150))
+        self.assertEqual(results, [(DELIVERY_SENT, "")] * 150)
+        self.assertEqual((transport.requests, len(transport.sent)), (2, 150))
+        recipient, message, started, finished = transport.sent[0]
+        self.assertEqual((recipient, message), ("user0@example.com", "Привет"))
+        self.assertLessEqual(started, finished)
+
+    def test_email_transport_uses_one_connection(self):
+        """Письма пачки отправляются через одно соединение"""
+        with patch("habits.transports.get_connection", wraps=get_connection) as mock_connection:
+            results = EmailTransport().deliver_many([("a@example.com", "Раз"), ("b@example.com", "Два")])
+        self.assertEqual(results, [(DELIVERY_SENT, "")] * 2)
+        self.assertEqual(mock_connection.call_count, 1)
+        self.assertEqual([email.to for email in mail.outbox], [["a@example.com"], ["b@example.com"]])
+
+    def test_webhook_transport_groups_by_url(self):
+        """Сообщения одному вебхуку уходят одним запросом, удалённый вебхук отклоняется"""
+        transport = WebhookTransport()
+        transport.session = MagicMock()
+        status_codes = {"https://hook.test": 200, "https://gone.test": 410, "https://moved.test": 302}
+        transport.session.post.side_effect = lambda url, json, timeout, allow_redirects: MagicMock(
+            ok=status_codes[url] < 400, is_redirect=status_codes[url] == 302, status_code=status_codes[url], text=""
+        )
+        results = transport.deliver_many(
+            [
+                ("https://hook.test", "Раз"),
+                ("https://gone.test", "Два"),
+                ("https://hook.test", "Три"),
+                ("https://moved.test", "Четыре"),
+            ]
+        )
+        self.assertEqual(
+            [outcome for outcome, _ in results], [DELIVERY_SENT, DELIVERY_REJECTED, DELIVERY_SENT, DELIVERY_REJECTED]
+        )
+        # Перенаправления не выполняются
+        self.assertEqual(transport.session.post.call_count, 3)
+        transport.session.post.assert_any_call(
+            "https://hook.test",
+            json={"messages": [{"text": "Раз"}, {"text": "Три"}]},
+            timeout=settings.WEBHOOK_TIMEOUT,
+            allow_redirects=False,
+        )
+
+    def test_webhook_transport_connects_to_checked_address(self):
+        """Вебхук подключается к проверенному при подключении адресу, во внутреннюю сеть - не подключается"""
+        addresses = {"hook.test": "93.184.216.34", "internal.test": "192.168.1.10"}
+        resolve = patch(
+            "users.validators.socket.getaddrinfo",
+            side_effect=lambda host, *args, **kwargs: [(None, None, None, "", (addresses[host], 443))],
+        )
+        with resolve as mock_resolve, patch(
+            "habits.transports.create_connection", side_effect=ConnectionRefusedError
+        ) as mock_connect:
+            results = WebhookTransport().deliver_many([("https://internal.test", "Раз"), ("https://hook.test", "Два")])
+
+        self.assertEqual([outcome for outcome, _ in results], [DELIVERY_REJECTED, DELIVERY_RETRY])
+        # Имя разрешается один раз - при подключении, и соединение устанавливается с этим адресом
+        self.assertEqual([call.args[0] for call in mock_resolve.call_args_list], ["internal.test", "hook.test"])
+        mock_connect.assert_called_once()
+        self.assertEqual(mock_connect.call_args.args[0], ("93.184.216.34", 443))
+        # SNI и заголовок Host - по имени хоста
+        self.assertEqual(PublicHTTPSConnection("hook.test", 443).host, "hook.test")
+
+    def test_reminder_uses_owner_transport(self):
+        """Напоминание уходит в канал, выбранный пользователем, по адресу из этого канала"""
+        now = timezone.now()
+        execution_time = timezone.localtime(now + timedelta(minutes=2)).time()
+        email_user = User.objects.create(email="mail@example.com", notification_transport="email")
+        Habit.objects.create(owner=email_user, action="Письмо", execution_time=execution_time)
+        # Без адреса в выбранном канале напоминание не ставится в очередь
+        webhook_user = User.objects.create(email="hook@example.com", notification_transport="webhook")
+        Habit.objects.create(owner=webhook_user, action="Вебхук", execution_time=execution_time)
+
+        send_habit_reminders(0, 10**9, (now - REMINDER_LEAD).isoformat(), (now + REMINDER_LEAD).isoformat())
+        self.assertEqual(
+            list(ReminderDelivery.objects.values_list("transport", "recipient")), [("email", "mail@example.com")]
+        )
+
+    @override_settings(NOTIFICATION_DEFAULT_TRANSPORT="local")
+    def test_default_transport_from_settings(self):
+        """Пользователи без выбранного канала получают напоминания через канал из настроек"""
+        transport = get_transport("local")
+        transport.reset()
+        ReminderDelivery.objects.create(transport="local", recipient="user@example.com", text="Привет")
+        self.assertEqual(drain_outbox(10, now=timezone.now()), {DELIVERY_SENT: 1})
+        self.assertEqual([sent[:2] for sent in transport.sent], [("user@example.com", "Привет")])
+
+    def test_benchmark_reminders(self):
+        """Бенчмарк доставляет все напоминания через фейковый телеграм и откатывает тестовые данные"""
+        for transport in ("telegram", "local"):
+            with self.subTest(transport=transport):
+                stdout = StringIO()
+                call_command(
+                    "benchmark_reminders",
+                    "--habits",
+                    "30",
+                    "--transport",
+                    transport,
+                    "--format",
+                    "json",
+                    stdout=stdout,
+                )
+                report = json.loads(stdout.getvalue())
+                self.assertEqual(report["delivery"]["messages"], 30)
+                self.assertGreater(report["delivery"]["transport_requests"], 0)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ReminderDelivery.objects.exists())
+
+
+class TelegramSenderTestCase(TestCase):
+    def setUp(self):
+        self.sleep = MagicMock()
+        self.sender = TelegramSender("https://telegram.test/sendMessage", max_workers=2, sleep=self.sleep)
+        self.sender.session = MagicMock()
+
+    def response(self, status_code, data=None):
+        return MagicMock(ok=status_code == 200, status_code=status_code, json=MagicMock(return_value=data or {}))
+
+    def test_send_success(self):
+        """Сообщение отправляется через общую сессию с таймаутом"""
+        self.sender.session.post.return_value = self.response(200)
+        self.assertTrue(self.sender.send("123", "Привет"))
+        self.sender.session.post.assert_called_once_with(
+            "https://telegram.test/sendMessage", json={"chat_id": "123", "text": "Привет"}, timeout=(3.05, 10)
+        )
+
+    def test_send_retries_after_rate_limit(self):
+        """На 429 отправка повторяется через retry_after из ответа телеграма"""
+        self.sender.session.post.side_effect = [
+            self.response(429, {"parameters": {"retry_after": 7}}),
+            self.response(200),
+        ]
+        self.assertTrue(self.sender.send("123", "Привет"))
+        self.sleep.assert_any_call(7)
+
+    def test_send_does_not_retry_client_error(self):
+        """Ошибки запроса (например, чат не найден) не повторяются"""
+        self.sender.session.post.return_value = self.response(400)
+        self.assertFalse(self.sender.send("123", "Привет"))
+        self.assertEqual(self.sender.session.post.call_count, 1)
+
+    def test_send_gives_up_after_retries(self):
+        """После исчерпания повторов отправка считается неуспешной"""
+        self.sender.session.post.side_effect = requests.ConnectionError("нет сети")
+        self.assertFalse(self.sender.send("123", "Привет"))
+        self.assertEqual(self.sender.session.post.call_count, self.sender.max_retries + 1)
+
+    def test_deliver_many(self):
+        """Пакетная отправка возвращает результат по каждому сообщению"""
+        self.sender.session.post.side_effect = lambda url, json, timeout: self.response(
+            200 if json["chat_id"] != "bad" else 400
+        )
+        results = self.sender.deliver_many([("1", "a"), ("bad", "b"), ("2", "c")])
+        self.assertEqual([outcome for outcome, _ in results], [DELIVERY_SENT, DELIVERY_REJECTED, DELIVERY_SENT])
+
+    def test_deliver_distinguishes_rejected_recipient(self):
+        """Отказ телеграма по получателю отличается от временной ошибки"""
+        self.sender.session.post.return_value = self.response(403)
+        self.assertEqual(self.sender.deliver("123", "Привет")[0], DELIVERY_REJECTED)
+
+        self.sender.session.post.return_value = self.response(502)
+        self.assertEqual(self.sender.deliver("123", "Привет")[0], DELIVERY_RETRY)
+
+    def test_deliver_does_not_reject_on_configuration_error(self):
+        """Неверный токен не делает получателя недоступным и не повторяется сразу"""
+        self.sender.session.post.return_value = self.response(401)
+        self.assertEqual(self.sender.deliver("123", "Привет")[0], DELIVERY_RETRY)
+        self.assertEqual(self.sender.session.post.call_count, 1)
+
+    def test_deliver_without_retries_returns_retry_after(self):
+        """Без повторов (очередь исходящих) 429 не ожидается, а возвращается с retry_after"""
+        self.sender.session.post.return_value = self.response(429, {"parameters": {"retry_after": 7}})
+        outcome, error = self.sender.deliver("123", "Привет", max_retries=0)
+        self.assertEqual((outcome, error.retry_after), (DELIVERY_RETRY, 7))
+        self.assertEqual(self.sender.session.post.call_count, 1)
+        self.sleep.assert_not_called()
+
+        transport = TelegramTransport(self.sender)
+        self.assertEqual(transport.deliver_many([("1", "a"), ("2", "b")])[1][1].retry_after, 7)
+        self.sleep.assert_not_called()
+
+    def test_token_bucket_limits_rate(self):
+        """Ограничитель заставляет ждать, когда токены закончились"""
+        bucket = TokenBucket(2, clock=lambda: 0, sleep=self.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.sleep.assert_not_called()
+        bucket.acquire()
+        self.sleep.assert_called_once_with(0.5)
@@ -0,0 +1,295 @@
+"""
+Каналы доставки напоминаний.
+
+Канал выбирается по пользователю (User.notification_transport), а если он не указан -
+по настройке NOTIFICATION_DEFAULT_TRANSPORT. Доступные каналы перечислены в NOTIFICATION_TRANSPORTS.
+Каждый канал объявляет, из какого поля пользователя берётся адрес получателя,
+и умеет ли он отправлять несколько сообщений одним запросом (supports_batching).
+Локальный канал LocalTransport ничего не отправляет, а только запоминает сообщения
+и время их доставки - для тестов и бенчмарков без обращения к внешним сервисам.
+"""
+
+import smtplib
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+from config import settings
+from habits.services import DELIVERY_REJECTED, DELIVERY_RETRY, DELIVERY_SENT, get_telegram_sender
+from users.validators import resolve_public_host
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Transport:
+    """Базовый канал доставки.
+    Каналы без пакетной отправки реализуют deliver, с пакетной - deliver_batch"""
+
+    # Поле пользователя с адресом получателя в этом канале
+    recipient_field = None
+    # Умеет ли канал отправлять несколько сообщений одним запросом
+    supports_batching = False
+    # Сколько сообщений отправлять одним запросом
+    max_batch_size = 1
+
+    def deliver(self, recipient, message):
+        """Отправляет одно сообщение, возвращает пару (результат доставки, текст ошибки)"""
+        return self.deliver_batch([(recipient, message)])[0]
+
+    def deliver_batch(self, messages):
+        """Отправляет сообщения (пары получатель, текст) одним запросом"""
+        return [self.deliver(recipient, message) for recipient, message in messages]
+
+    def deliver_many(self, messages):
+        """Отправляет сообщения (пары получатель, текст), возвращает пары (результат, ошибка) по каждому"""
+        messages = list(messages)
+        if not self.supports_batching:
+            return [self.deliver(recipient, message) for recipient, message in messages]
+        results = []
+        for start in range(0, len(messages), self.max_batch_size):
+            results.extend(self.deliver_batch(messages[start : start + self.max_batch_size]))
+        return results
+
+
+class TelegramTransport(Transport):
+    """Телеграм: каждое сообщение - отдельный запрос, запросы выполняются параллельно
+    через общий пул соединений с ограничением частоты. Повторы выполняет очередь исходящих,
+    поэтому отправитель не повторяет запросы сам и не ждёт retry_after"""
+
+    recipient_field = "tg_chat_id"
+
+    def __init__(self, sender=None):
+        # По умолчанию - общий для процесса отправитель из настроек
+        self.sender = sender
+
+    def get_sender(self):
+        return self.sender or get_telegram_sender()
+
+    def deliver(self, recipient, message):
+        return self.get_sender().deliver(recipient, message, max_retries=0)
+
+    def deliver_many(self, messages):
+        return self.get_sender().deliver_many(messages, max_retries=0)
+
+
+class EmailTransport(Transport):
+    """Email: пачка писем отправляется через одно соединение с почтовым сервером"""
+
+    recipient_field = "email"
+    supports_batching = True
+    max_batch_size = 100
+
+    def deliver_batch(self, messages):
+        try:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning(f"Email delivery error: {e}")
+            return [(DELIVERY_RETRY, str(e))] * len(messages)
+
+        results = []
+        try:
+            for recipient, message in messages:
+                email = EmailMessage(settings.REMINDER_EMAIL_SUBJECT, message, to=[recipient], connection=connection)
+                try:
+                    email.send()
+                except smtplib.SMTPRecipientsRefused as e:
+                    results.append((DELIVERY_REJECTED, str(e)))
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning(f"Email delivery error: {e}")
+                    results.append((DELIVERY_RETRY, str(e)))
+                else:
+                    results.append((DELIVERY_SENT, ""))
+        finally:
+            connection.close()
+        return results
+
+
+class PublicAddressConnectionMixin:
+    """Соединение urllib3, которое проверяет адреса хоста при подключении и подключается к проверенному адресу.
+    Имя хоста разрешается один раз, поэтому подмена DNS между проверкой и подключением (DNS rebinding)
+    не приводит к запросу во внутреннюю сеть. SNI, проверка сертификата и заголовок Host используют имя хоста.
+    Если адрес не публичный, поднимается ValidationError"""
+
+    def _new_conn(self):
+        error = None
+        for address in resolve_public_host(self._dns_host):
+            try:
+                return create_connection(
+                    (address, self.port),
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options,
+                )
+            except TimeoutError as e:
+                raise ConnectTimeoutError(self, f"Connection to {self.host} timed out") from e
+            except OSError as e:
+                error = e
+        raise NewConnectionError(self, f"Failed to establish a new connection: {error}") from error
+
+
+class PublicHTTPConnection(PublicAddressConnectionMixin, HTTPConnection):
+    pass
+
+
+class PublicHTTPSConnection(PublicAddressConnectionMixin, HTTPSConnection):
+    pass
+
+
+class PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PublicHTTPConnection
+
+
+class PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    """Адаптер requests, который подключается только к публичным адресам (см. PublicAddressConnectionMixin)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": PublicHTTPConnectionPool,
+            "https": PublicHTTPSConnectionPool,
+        }
+
+
+class WebhookTransport(Transport):
+    """Вебхук пользователя: сообщения пачки, адресованные одному вебхуку, отправляются одним POST-запросом
+    вида {"messages": [{"text": ...}, ...]}"""
+
+    recipient_field = "webhook_url"
+    supports_batching = True
+    max_batch_size = 100
+
+    # Ответы, после которых вебхук считается удалённым
+    rejected_status_codes = (404, 410)
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.session = requests.Session()
+        # Адрес проверяется при подключении, и соединение устанавливается с проверенным адресом.
+        # Прокси из окружения не используются: через них запрос ушёл бы в обход проверки
+        self.session.trust_env = False
+        self.session.mount("https://", PublicAddressAdapter())
+        self.session.mount("http://", PublicAddressAdapter())
+
+    def deliver_batch(self, messages):
+        positions = defaultdict(list)
+        for position, (recipient, _) in enumerate(messages):
+            positions[recipient].append(position)
+
+        results = [None] * len(messages)
+        for url, url_positions in positions.items():
+            result = self._post(url, [{"text": messages[position][1]} for position in url_positions])
+            for position in url_positions:
+                results[position] = result
+        return results
+
+    def _post(self, url, payload):
+        try:
+            response = self.session.post(url, json={"messages": payload}, timeout=self.timeout, allow_redirects=False)
+        except ValidationError as e:
+            # DNS-имя вебхука могло начать указывать во внутреннюю сеть
+            logger.warning(f"Webhook rejected: {e}")
+            return DELIVERY_REJECTED, " ".join(e.messages)
+        except requests.RequestException as e:
+            logger.warning(f"Webhook error: {e}")
+            return DELIVERY_RETRY, str(e)
+        if response.ok and not response.is_redirect:
+            return DELIVERY_SENT, ""
+        error = f"{response.status_code}: {response.text[:200]}"
+        # Перенаправления не выполняются: они могут вести во внутреннюю сеть
+        if response.status_code in self.rejected_status_codes or response.is_redirect:
+            return DELIVERY_REJECTED, error
+        logger.warning(f"Webhook error {error}")
+        return DELIVERY_RETRY, error
+
+
+class LocalTransport(Transport):
+    """Локальный канал без внешних запросов: запоминает сообщения и моменты их доставки.
+    latency - имитация задержки сети на каждый запрос в секундах"""
+
+    recipient_field = "email"
+    supports_batching = True
+    max_batch_size = 100
+
+    def __init__(self, latency=None):
+        self.latency = settings.LOCAL_TRANSPORT_LATENCY if latency is None else latency
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Забывает отправленные сообщения и статистику запросов"""
+        with self.lock:
+            self.sent = []
+            self.requests = 0
+
+    def deliver_batch(self, messages):
+        started = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        finished = time.perf_counter()
+        with self.lock:
+            self.requests += 1
+            self.sent.extend((recipient, message, started, finished) for recipient, message in messages)
+        return [(DELIVERY_SENT, "")] * len(messages)
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport_class(name):
+    """Класс канала доставки по названию из NOTIFICATION_TRANSPORTS"""
+    return import_string(settings.NOTIFICATION_TRANSPORTS[name])
+
+
+def get_transport(name):
+    """Общий для процесса экземпляр канала доставки"""
+    with _transports_lock:
+        if name not in _transports:
+            _transports[name] = get_transport_class(name)()
+        return _transports[name]
+
+
+def set_transport(name, transport):
+    """Подменяет экземпляр канала доставки (для тестов и бенчмарков), возвращает прежний или None"""
+    with _transports_lock:
+        previous = _transports.get(name)
+        if transport is None:
+            _transports.pop(name, None)
+        else:
+            _transports[name] = transport
+        return previous
+
+
+def get_recipient_fields():
+    """Поля пользователя с адресами получателей во всех настроенных каналах"""
+    return sorted({get_transport_class(name).recipient_field for name in settings.NOTIFICATION_TRANSPORTS})
+
+
+def reachable_owner_q():
+    """Условие на привычки, владельцу которых можно доставить напоминание:
+    в выбранном (или используемом по умолчанию) канале у него указан адрес"""
+    condition = Q()
+    for name in settings.NOTIFICATION_TRANSPORTS:
+        transports = [name, ""] if name == settings.NOTIFICATION_DEFAULT_TRANSPORT else [name]
+        condition |= Q(
+            owner__notification_transport__in=transports,
+            **{f"owner__{get_transport_class(name).recipient_field}__isnull": False},
+        )
+    return condition
@@ -2,7 +2,7 @@ from django.urls import path
 from rest_framework.routers import SimpleRouter
 
 from habits.apps import HabitsConfig
-from habits.views import HabitViewSet, PlaceCreateApiView, PlaceListAPIview, PublicHabitViewSet
+from habits.views import HabitStatsAPIView, HabitViewSet, PlaceCreateApiView, PlaceListAPIview, PublicHabitViewSet
 
 app_name = HabitsConfig.name
 
@@ -14,6 +14,7 @@ router.register("public-habits", PublicHabitViewSet, basename="public-habits")
 urlpatterns = [
     path("places/create/", PlaceCreateApiView.as_view(), name="places-create"),
     path("places/", PlaceListAPIview.as_view(), name="places-list"),
+    path("stats/", HabitStatsAPIView.as_view(), name="stats"),
 ]
 
 urlpatterns += router.urls
@@ -1,14 +1,138 @@
+import re
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import CreateAPIView, ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.serializers import as_serializer_error
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from habits.models import Habit, Place
+from config import settings
+from config.instrumentation import timed
+from habits.cache import bump_public_feed_version, get_public_feed_cache_key
+from habits.export import EXPORT_FORMATS, stream_export
+from habits.models import Habit, HabitStreak, Place
 from habits.paginators import CustomPagination
-from habits.serializers import HabitSerializer, PlaceSerializer
+from habits.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from habits.scheduling import MAX_PERIODICITY, due_habits, get_local_today, get_zone, iter_occurrences
+from habits.serializers import (
+    HabitCompletionSerializer,
+    HabitExportQuerySerializer,
+    HabitRepresentationQuerySerializer,
+    HabitSerializer,
+    HabitStatsQuerySerializer,
+    HabitStatsSerializer,
+    HabitStreakSerializer,
+    PlaceSerializer,
+    get_habit_row_serializer,
+    UpcomingReminderSerializer,
+    load_related_objects,
+)
+from habits.stats import get_owner_stats
+from habits.streaks import register_completion
 from users.permissions import IsOwner
 
+# Клиент принимает ответ, сжатый gzip (как в django.middleware.gzip)
+accepts_gzip = re.compile(r"\bgzip\b")
+
+
+class HabitRepresentationMixin:
+    """Представление привычек при просмотре (list, retrieve): ?expand= разворачивает связи,
+    загружая их тем же запросом через JOIN, ?fields= сокращает и поля ответа, и столбцы в SQL.
+    Списки строятся из values() без сериализатора (HABITS_FAST_LIST) и кодируются FastJSONRenderer"""
+
+    representation_actions = ("list", "retrieve")
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    # Связи, которые можно развернуть по ?expand=
+    expandable_fields = tuple(HabitSerializer.expandable_fields)
+
+    def get_representation(self):
+        if not hasattr(self, "_representation"):
+            self._representation = {"expand": [], "fields": None}
+            if self.action in self.representation_actions:
+                query = HabitRepresentationQuerySerializer(
+                    data=self.request.query_params, context={"expandable_fields": self.expandable_fields}
+                )
+                query.is_valid(raise_exception=True)
+                self._representation = query.validated_data
+        return self._representation
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(self.get_representation())
+        return context
+
+    def get_row_serializer(self):
+        """Скомпилированное представление строк values() для текущих ?fields= и ?expand=, None - обычный путь"""
+        if not settings.HABITS_FAST_LIST:
+            return None
+        representation = self.get_representation()
+        fields = representation["fields"]
+        return get_habit_row_serializer(
+            tuple(sorted(set(fields))) if fields is not None else None, tuple(sorted(set(representation["expand"])))
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Список без экземпляров моделей и дерева полей сериализатора: строки values() переводятся в словари
+        скомпилированной функцией, ответ совпадает с HabitSerializer байт в байт"""
+        row_serializer = self.get_row_serializer()
+        if row_serializer is None:
+            return self.list_serialized(request)
+
+        columns, to_dict = row_serializer
+        # id нужен курсорной пагинации, даже если его нет в ответе
+        queryset = self.filter_queryset(self.get_queryset()).values(*{"id", *columns})
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        with timed("serialize"):
+            data = [to_dict(row) for row in rows]
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    def serialize(self, instance, many=False):
+        """Данные сериализатора; время сериализации - отдельный этап замеров (serialize)"""
+        if many:
+            # Экземпляры загружаются до замера, чтобы время SQL не попало в сериализацию
+            instance = list(instance)
+        serializer = self.get_serializer(instance, many=many)
+        with timed("serialize"):
+            return serializer.data
 
-class HabitViewSet(ModelViewSet):
+    def list_serialized(self, request):
+        """Список через HabitSerializer, как ListModelMixin.list, но с замером сериализации"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize(page, many=True))
+        return Response(self.serialize(queryset, many=True))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize(self.get_object()))
+
+    def optimize_queryset(self, queryset):
+        representation = self.get_representation()
+        fields, expand = representation["fields"], representation["expand"]
+        if fields is not None:
+            expand = [name for name in expand if name in fields]
+        if expand:
+            queryset = queryset.select_related(*expand)
+        columns = HabitSerializer.get_read_columns(fields, expand)
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class HabitViewSet(HabitRepresentationMixin, ModelViewSet):
     """Вьюсет для реализации CRUD привычки"""
 
     queryset = Habit.objects.all()
@@ -18,12 +142,11 @@ class HabitViewSet(ModelViewSet):
     def perform_create(self, serializer):
         """Метод perform_create из Django REST Framework (DRF),
         предназначенный для кастомизации процесса создания объектов через API."""
-        habit = serializer.save()  # создаёт объект Course из валидных данных
-        habit.owner = self.request.user  # Привязывает текущего пользователя к полю owner
-        habit.save()  # Сохраняет объект с обновлёнными данными
+        # Владелец передаётся сразу, чтобы привычка сохранялась и валидировалась один раз
+        serializer.save(owner=self.request.user)
 
     def get_permissions(self):
-        if self.action in ["update", "partial_update", "retrieve", "destroy"]:
+        if self.action in ["update", "partial_update", "retrieve", "destroy", "complete", "streak"]:
             self.permission_classes = [IsAuthenticated, IsOwner]
         else:
             self.permission_classes = [IsAuthenticated]
@@ -31,19 +154,202 @@ class HabitViewSet(ModelViewSet):
 
     def get_queryset(self):
         """Переопределяем queryset для фильтрации по текущему пользователю"""
-        return super().get_queryset().filter(owner=self.request.user)
+        return self.optimize_queryset(super().get_queryset().filter(owner=self.request.user).order_by("id"))
+
+    def get_object(self):
+        """Привычка ищется одним запросом среди привычек пользователя, чужая - 404.
+        Владелец - текущий пользователь, поэтому отдельно не загружается (нужен для часового пояса при сохранении)"""
+        habit = super().get_object()
+        habit.owner = self.request.user
+        return habit
+
+    @action(detail=False, methods=["post", "patch", "delete"])
+    def bulk(self, request):
+        """Пакетная обработка привычек одним запросом в одной транзакции:
+        POST - создание по списку привычек, PATCH - изменение по списку привычек с id,
+        DELETE - удаление по списку id. Ошибки возвращаются списком в порядке элементов запроса"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"non_field_errors": ["Ожидается непустой список"]})
+        if len(items) > settings.HABITS_BULK_MAX_SIZE:
+            raise ValidationError(
+                {"non_field_errors": [f"Не более {settings.HABITS_BULK_MAX_SIZE} элементов в одном запросе"]}
+            )
+
+        if request.method == "DELETE":
+            return self.bulk_destroy(items)
+        return self.bulk_save(items, partial=request.method == "PATCH")
+
+    def bulk_save(self, items, partial):
+        """Валидирует все элементы за один проход и записывает их bulk_create/bulk_update"""
+        context = self.get_serializer_context()
+        context["related_objects"] = load_related_objects(self.get_serializer(), items)
+        instances = {}
+        if partial:
+            ids = {item.get("id") for item in items if isinstance(item, dict) and isinstance(item.get("id"), int)}
+            instances = self.get_queryset().in_bulk(ids)
+
+        habits, errors = [], []
+        for item in items:
+            instance = instances.get(item.get("id")) if partial and isinstance(item, dict) else None
+            if partial and instance is None:
+                errors.append({"id": ["Привычка не найдена"]})
+                continue
+
+            serializer = self.get_serializer(instance, data=item, partial=partial, context=context)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
 
+            habit = instance or Habit(owner=self.request.user)
+            for attr, value in serializer.validated_data.items():
+                setattr(habit, attr, value)
+            habit.apply_reward_rules()
+            try:
+                # Связанные объекты уже загружены сериализатором, поэтому проверка обходится без запросов
+                habit.full_clean(exclude=habit.get_validated_relations())
+            except DjangoValidationError as e:
+                errors.append(as_serializer_error(e))
+                continue
+            habit.sync_schedule()
+            habits.append(habit)
+            errors.append({})
 
-class PublicHabitViewSet(ReadOnlyModelViewSet):
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        was_published = any(habit._loaded_is_published for habit in habits if partial)
+        with transaction.atomic():
+            if partial:
+                fields = [field.name for field in Habit._meta.concrete_fields if not field.primary_key]
+                Habit.objects.bulk_update(habits, fields)
+            else:
+                Habit.objects.bulk_create(habits)
+        if was_published or any(habit.is_published for habit in habits):
+            bump_public_feed_version()
+
+        data = self.get_serializer(habits, many=True).data
+        return Response(data, status=status.HTTP_200_OK if partial else status.HTTP_201_CREATED)
+
+    def bulk_destroy(self, ids):
+        """Удаляет привычки пользователя по списку id, возвращает результат по каждому id"""
+        if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            raise ValidationError({"non_field_errors": ["Ожидается список id привычек"]})
+        with transaction.atomic():
+            deleted = set(self.get_queryset().filter(id__in=ids).values_list("id", flat=True))
+            self.get_queryset().filter(id__in=deleted).delete()
+        return Response([{"id": pk, "deleted": pk in deleted} for pk in ids])
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        """Отметка о выполнении привычки (по умолчанию - сегодня), возвращает сводку серий"""
+        habit = self.get_object()
+        # "Сегодня" - по часовому поясу пользователя, а не сервера
+        context = {"today": get_local_today(request.user.timezone)}
+        serializer = HabitCompletionSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        completed_on = serializer.validated_data.get("completed_on", context["today"])
+
+        streak, created = register_completion(habit, completed_on)
+        return Response(
+            HabitStreakSerializer(streak, context=context).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"])
+    def streak(self, request, pk=None):
+        """Сводка серий выполнения привычки"""
+        habit = self.get_object()
+        streak = HabitStreak.objects.filter(habit=habit).first() or HabitStreak(habit=habit)
+        context = {"today": get_local_today(request.user.timezone)}
+        return Response(HabitStreakSerializer(streak, context=context).data)
+
+    @action(detail=False, methods=["get"])
+    def upcoming(self, request):
+        """Предстоящие напоминания текущего пользователя на ближайшие дни (?days=1..7)"""
+        try:
+            days = int(request.query_params.get("days", 1))
+        except ValueError:
+            raise ValidationError({"days": "Укажите целое число дней"})
+        if not 1 <= days <= MAX_PERIODICITY:
+            raise ValidationError({"days": f"Количество дней должно быть от 1 до {MAX_PERIODICITY}"})
+
+        now = timezone.now()
+        end = now + timedelta(days=days)
+        tz = get_zone(request.user.timezone)
+        reminders = [
+            {"habit": habit.pk, "action": habit.action, "scheduled_for": scheduled_for}
+            for habit in due_habits(now, end, self.get_queryset(), now)
+            for scheduled_for in iter_occurrences(habit, now, end, tz)
+        ]
+        reminders.sort(key=lambda reminder: (reminder["scheduled_for"], reminder["habit"]))
+        return Response(UpcomingReminderSerializer(reminders, many=True).data)
+
+    @action(detail=False, methods=["get"], renderer_classes=[NDJSONRenderer, CSVRenderer, FastJSONRenderer])
+    def export(self, request):
+        """Потоковая выгрузка всех привычек (?dataset=habits) или истории выполнений (?dataset=completions)
+        текущего пользователя в формате ?export_format=ndjson|csv одним запросом. Без export_format
+        формат выбирается по Accept (application/x-ndjson или text/csv), по умолчанию - NDJSON.
+        Клиенту с Accept-Encoding: gzip выгрузка сжимается на лету"""
+        params = request.query_params.copy()
+        if request.accepted_renderer.format in EXPORT_FORMATS:
+            params.setdefault("export_format", request.accepted_renderer.format)
+        query = HabitExportQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        dataset, export_format = query.validated_data["dataset"], query.validated_data["export_format"]
+        use_gzip = bool(accepts_gzip.search(request.headers.get("Accept-Encoding", "")))
+
+        content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            stream_export(dataset, export_format, owner=request.user, gzip=use_gzip), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{dataset}.{extension}"'
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
+
+
+class PublicHabitViewSet(HabitRepresentationMixin, ReadOnlyModelViewSet):
     """Вьюсет для просмотра публичных привычек без авторизации"""
 
     serializer_class = HabitSerializer
     pagination_class = CustomPagination
     permission_classes = [AllowAny]  # Доступ без авторизации
+    # Связанная приятная привычка может быть не опубликована - в ленте отдаётся только её id
+    expandable_fields = ("place",)
 
     def get_queryset(self):
         """Все публичные привычки всех пользователей"""
-        return Habit.objects.filter(is_published=True)
+        return self.optimize_queryset(Habit.objects.filter(is_published=True).order_by("id"))
+
+    def list(self, request, *args, **kwargs):
+        """Страницы ленты отдаются из кеша; клиент с актуальным ETag получает 304 без запросов к базе.
+        Кешируется только JSON: страница BrowsableAPIRenderer содержит CSRF-токен запросившего"""
+        if isinstance(request.accepted_renderer, BrowsableAPIRenderer):
+            return super().list(request, *args, **kwargs)
+        self.cache_key, etag = get_public_feed_cache_key(request)
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            cached = cache.get(self.cache_key)
+            if cached is None:
+                response = super().list(request, *args, **kwargs)
+            else:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Кеширует отрисованную страницу ленты, собранную в list"""
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "cache_key", None) and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            cache.set(
+                self.cache_key, (response.content, response["Content-Type"]), settings.PUBLIC_HABITS_CACHE_TIMEOUT
+            )
+        return response
 
 
 class PlaceCreateApiView(CreateAPIView):
@@ -59,3 +365,18 @@ class PlaceListAPIview(ListAPIView):
     queryset = Place.objects.all()
     serializer_class = PlaceSerializer
     permission_classes = (IsAuthenticated,)
+
+
+class HabitStatsAPIView(APIView):
+    """Статистика выполнения привычек текущего пользователя по дням или неделям.
+    Параметры: ?period=day|week&start=YYYY-MM-DD&end=YYYY-MM-DD"""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        query = HabitStatsQuerySerializer(
+            data=request.query_params, context={"today": get_local_today(request.user.timezone)}
+        )
+        query.is_valid(raise_exception=True)
+        stats = get_owner_stats(request.user, **query.validated_data)
+        return Response(HabitStatsSerializer(stats).data)
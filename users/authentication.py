@@ -0,0 +1,81 @@
+"""
+Аутентификация по JWT с кешированием пользователя.
+
+Стандартная JWTAuthentication на каждый запрос загружает пользователя из базы по id из токена.
+CachedJWTAuthentication берёт его из общего кеша AUTH_CACHE_ALIAS (Redis, настраивается только
+при заданном CACHE_LOCATION) на AUTH_USER_CACHE_TIMEOUT секунд, поэтому в установившемся режиме
+запрос пользователя к базе не выполняется. Без общего кеша пользователь загружается из базы, как в JWTAuthentication.
+Проверки активности пользователя и смены пароля (CHECK_USER_IS_ACTIVE, CHECK_REVOKE_TOKEN) выполняются
+и для пользователя из кеша.
+
+Запись сбрасывается сигналами при сохранении и удалении пользователя, в том числе при деактивации,
+и ещё раз после коммита транзакции, чтобы параллельный запрос не положил в кеш старую версию.
+Кеш процесса не используется: его нельзя сбросить сразу во всех воркерах.
+Изменения через QuerySet.update() сигналов не вызывают - после них нужно вызвать invalidate_cached_user.
+"""
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from config import settings
+from config.instrumentation import timed
+
+
+def get_user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+def get_auth_cache():
+    """Общий кеш аутентификации или None, если он не настроен"""
+    if settings.AUTH_CACHE_ALIAS not in caches.settings:
+        return None
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def invalidate_cached_user(user_id):
+    """Сбрасывает пользователя в кеше аутентификации сейчас и после коммита текущей транзакции"""
+    cache = get_auth_cache()
+    if cache is None:
+        return
+    key = get_user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, которая берёт пользователя из кеша, а при промахе - из базы"""
+
+    def authenticate(self, request):
+        with timed("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = get_auth_cache()
+        if cache is None:
+            return super().get_user(validated_token)
+
+        key = get_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Базовая реализация загружает пользователя и проверяет его
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+import users.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_user_tg_chat_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="timezone",
+            field=models.CharField(
+                default="UTC",
+                help_text="Часовой пояс, в котором указано время выполнения привычек, например Europe/Moscow",
+                max_length=64,
+                validators=[users.validators.validate_timezone],
+                verbose_name="Часовой пояс",
+            ),
+        ),
+    ]
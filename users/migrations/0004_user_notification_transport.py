@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+import users.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_user_timezone"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="notification_transport",
+            field=models.CharField(
+                blank=True,
+                choices=[("telegram", "Телеграм"), ("email", "Email"), ("webhook", "Вебхук")],
+                default="",
+                help_text="Куда отправлять напоминания; если не указан, используется канал по умолчанию",
+                max_length=20,
+                verbose_name="Канал напоминаний",
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="webhook_url",
+            field=models.URLField(
+                blank=True,
+                help_text="HTTPS-адрес, на который отправляются напоминания при выборе канала Вебхук",
+                null=True,
+                validators=[users.validators.validate_webhook_url],
+                verbose_name="Вебхук",
+            ),
+        ),
+    ]
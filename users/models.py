@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from users.validators import validate_timezone, validate_webhook_url
+
 
 class User(AbstractUser):
     """Класс модели User"""
@@ -35,6 +37,33 @@ class User(AbstractUser):
         null=True,
         help_text="Укажите телеграм chat_id",
     )
+    timezone = models.CharField(
+        verbose_name="Часовой пояс",
+        max_length=64,
+        default="UTC",
+        validators=[validate_timezone],
+        help_text="Часовой пояс, в котором указано время выполнения привычек, например Europe/Moscow",
+    )
+
+    notification_transport = models.CharField(
+        verbose_name="Канал напоминаний",
+        max_length=20,
+        blank=True,
+        default="",
+        choices=(
+            ("telegram", "Телеграм"),
+            ("email", "Email"),
+            ("webhook", "Вебхук"),
+        ),
+        help_text="Куда отправлять напоминания; если не указан, используется канал по умолчанию",
+    )
+    webhook_url = models.URLField(
+        verbose_name="Вебхук",
+        blank=True,
+        null=True,
+        validators=[validate_webhook_url],
+        help_text="HTTPS-адрес, на который отправляются напоминания при выборе канала Вебхук",
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
@@ -44,3 +73,10 @@ class User(AbstractUser):
 
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженный часовой пояс, чтобы пересчитывать расписание привычек только при его смене"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_timezone = instance.__dict__.get("timezone")
+        return instance
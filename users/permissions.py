@@ -1,10 +1,15 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import permissions
 
 
 class IsOwner(permissions.BasePermission):
-    """Разрешает доступ только владельцу привычки"""
+    """Разрешает доступ только владельцу объекта.
+    Поле владельца задаётся атрибутом owner_field вьюхи (по умолчанию owner);
+    сравнивается id владельца, сам владелец из базы не загружается"""
 
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, "owner"):
-            return obj.owner == request.user
-        return False
+        try:
+            field = obj._meta.get_field(getattr(view, "owner_field", "owner"))
+        except FieldDoesNotExist:
+            return False
+        return getattr(obj, field.attname) == request.user.pk
@@ -13,4 +13,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = (
             "password",
             "email",
+            "timezone",
+            "notification_transport",
+            "webhook_url",
         )
@@ -1,8 +1,20 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import settings
 
+from habits.models import Habit, Place
+from users.authentication import get_user_cache_key
 from users.models import User
+from users.permissions import IsOwner
 
 
 class UserModelTestCase(APITestCase):
@@ -36,3 +48,115 @@ class UserModelTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("email", response.data)
         self.assertEqual(User.objects.count(), 1)
+
+    def test_invalid_timezone_rejection(self):
+        """Часовой пояс должен быть из базы IANA"""
+        response = self.client.post(self.create_url, {**self.valid_data, "timezone": "Mars/Olympus"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("timezone", response.data)
+
+    def test_webhook_must_use_https(self):
+        """Вебхук для напоминаний принимается только по HTTPS"""
+        response = self.client.post(
+            self.create_url,
+            {**self.valid_data, "notification_transport": "webhook", "webhook_url": "http://hook.test"},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("webhook_url", response.data)
+
+    def test_webhook_must_be_public(self):
+        """Вебхук во внутреннюю сеть не принимается: ни по IP, ни по имени, указывающему на внутренний адрес"""
+        addresses = {"hook.test": "93.184.216.34", "intranet.test": "10.0.0.5"}
+        with patch(
+            "users.validators.socket.getaddrinfo",
+            side_effect=lambda host, *args, **kwargs: [(None, None, None, "", (addresses.get(host, host), 443))],
+        ):
+            for url in (
+                "https://127.0.0.1/hook",
+                "https://169.254.169.254/latest",
+                "https://[::1]/hook",
+                "https://intranet.test",
+            ):
+                with self.subTest(url=url):
+                    response = self.client.post(
+                        self.create_url, {**self.valid_data, "notification_transport": "webhook", "webhook_url": url}
+                    )
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                    self.assertIn("webhook_url", response.data)
+
+            response = self.client.post(
+                self.create_url,
+                {**self.valid_data, "notification_transport": "webhook", "webhook_url": "https://hook.test"},
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+LOCMEM_CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+
+
+@override_settings(CACHES={"default": LOCMEM_CACHE, settings.AUTH_CACHE_ALIAS: LOCMEM_CACHE})
+class CachedJWTAuthenticationTestCase(APITestCase):
+    """Тесты для CachedJWTAuthentication"""
+
+    def setUp(self):
+        caches[settings.AUTH_CACHE_ALIAS].clear()
+        self.user = User.objects.create(email="test@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.url = reverse("habits:my-habits-list")
+
+    def test_user_served_from_cache(self):
+        """После первого запроса пользователь берётся из кеша, без запроса к базе"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries if User._meta.db_table in query["sql"]])
+
+    def test_deactivation_invalidates_cache(self):
+        """Деактивированный пользователь сразу теряет доступ"""
+        self.client.get(self.url)
+        self.assertIsNotNone(caches[settings.AUTH_CACHE_ALIAS].get(get_user_cache_key(self.user.pk)))
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(caches[settings.AUTH_CACHE_ALIAS].get(get_user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_rejected(self):
+        """Удалённый пользователь не аутентифицируется по старому токену"""
+        self.client.get(self.url)
+        self.user.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHES={"default": LOCMEM_CACHE})
+    def test_without_shared_cache(self):
+        """Без общего кеша пользователь загружается из базы, деактивация действует сразу"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertTrue([query for query in queries if User._meta.db_table in query["sql"]])
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class IsOwnerTestCase(APITestCase):
+    """Тесты для IsOwner"""
+
+    def test_compares_owner_id(self):
+        """Владелец сравнивается по id без загрузки, объекты без владельца недоступны"""
+        user = User.objects.create(email="test@example.com")
+        other = User.objects.create(email="other@example.com")
+        habit = Habit.objects.get(pk=Habit.objects.create(owner=user, action="Бег").pk)
+        request = MagicMock(user=user)
+        view = MagicMock(spec=[])
+
+        with self.assertNumQueries(0):
+            self.assertTrue(IsOwner().has_object_permission(request, view, habit))
+            self.assertFalse(IsOwner().has_object_permission(MagicMock(user=other), view, habit))
+            self.assertFalse(IsOwner().has_object_permission(request, view, Place(name="Дом")))
@@ -0,0 +1,57 @@
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.utils.translation import gettext_lazy as _
+
+
+def validate_timezone(value):
+    """
+    Валидатор часового пояса пользователя
+    - Название из базы часовых поясов IANA, например Europe/Moscow
+    """
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(
+            _("Укажите часовой пояс из базы IANA, например Europe/Moscow"),
+            params={"value": value},
+        )
+
+
+def validate_webhook_url(value):
+    """
+    Валидатор адреса вебхука для напоминаний
+    - Только HTTPS
+    - Только публичные адреса: сервер не должен отправлять запросы во внутреннюю сеть
+    """
+    URLValidator(schemes=["https"], message=_("Укажите адрес вебхука, начинающийся с https://"))(value)
+    validate_public_host(value)
+
+
+def validate_public_host(value):
+    """
+    Валидатор хоста URL
+    - Все адреса, в которые разрешается имя хоста, публичные: не loopback, не частные сети (RFC 1918),
+      не link-local и не зарезервированные
+    Возвращает проверенные адреса
+    """
+    return resolve_public_host(urlsplit(value).hostname)
+
+
+def resolve_public_host(host):
+    """Разрешает имя хоста в адреса и проверяет, что все они публичные. Возвращает список адресов"""
+    try:
+        addresses = list(
+            dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP))
+        )
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValidationError(_("Не удалось найти адрес хоста %(host)s"), params={"host": host})
+    for address in addresses:
+        # Адрес IPv6 может содержать зону: fe80::1%eth0
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValidationError(_("Адрес хоста %(host)s не публичный"), params={"host": host})
+    return addresses